@@ -1,17 +1,58 @@
 from django.contrib import admin
-from .models import Product, Cart, CartItem, ProductReview, UserRoutine, RoutineStep, SkincareReminder
+from .models import Product, Cart, CartItem, Order, OrderItem, PaymentEvent, ProductReview, UserRoutine, RoutineStep, SkincareReminder
+from .search import filter_products
+from .cart import recalculate_cart_totals
 
 class CartItemInline(admin.TabularInline):
     model = CartItem
     extra = 0
 
 class CartAdmin(admin.ModelAdmin):
-    list_display = ['user', 'created_at', 'updated_at', 'get_total_items']
+    list_display = ['user', 'created_at', 'updated_at', 'total_items', 'subtotal']
+    readonly_fields = ['total_items', 'subtotal']
     inlines = [CartItemInline]
     
-    def get_total_items(self, obj):
-        return obj.get_total_items()
-    get_total_items.short_description = 'Total Items'
+    def save_related(self, request, form, formsets, change):
+        super().save_related(request, form, formsets, change)
+        # Inline edits bypass the cart service, so rebuild the counters
+        recalculate_cart_totals(form.instance)
+
+class CartItemAdmin(admin.ModelAdmin):
+    list_display = ['cart', 'product', 'quantity', 'added_at']
+    
+    def save_model(self, request, obj, form, change):
+        super().save_model(request, obj, form, change)
+        recalculate_cart_totals(obj.cart)
+    
+    def delete_model(self, request, obj):
+        super().delete_model(request, obj)
+        recalculate_cart_totals(obj.cart)
+    
+    def delete_queryset(self, request, queryset):
+        carts = list(Cart.objects.filter(items__in=queryset).distinct())
+        super().delete_queryset(request, queryset)
+        for cart in carts:
+            recalculate_cart_totals(cart)
+
+class OrderItemInline(admin.TabularInline):
+    model = OrderItem
+    extra = 0
+    readonly_fields = ['product', 'product_name', 'product_brand', 'unit_price', 'quantity', 'line_total']
+
+@admin.register(Order)
+class OrderAdmin(admin.ModelAdmin):
+    list_display = ['id', 'user', 'status', 'total_items', 'total', 'created_at', 'paid_at']
+    list_filter = ['status', 'created_at']
+    search_fields = ['user__username', 'razorpay_order_id', 'razorpay_payment_id']
+    readonly_fields = ['total_items', 'subtotal', 'tax', 'total', 'cart_version', 'created_at', 'paid_at']
+    inlines = [OrderItemInline]
+
+@admin.register(PaymentEvent)
+class PaymentEventAdmin(admin.ModelAdmin):
+    list_display = ['event_id', 'event_type', 'status', 'attempts', 'next_attempt_at', 'received_at', 'processed_at']
+    list_filter = ['status', 'event_type']
+    search_fields = ['event_id']
+    readonly_fields = ['event_id', 'event_type', 'payload', 'attempts', 'last_error', 'received_at', 'processed_at']
 
 class RoutineStepInline(admin.TabularInline):
     model = RoutineStep
@@ -43,11 +84,17 @@ class UserRoutineAdmin(admin.ModelAdmin):
 
 @admin.register(Product)
 class ProductAdmin(admin.ModelAdmin):
-    list_display = ['name', 'brand', 'product_type', 'skin_type', 'price', 'image']
-    list_filter = ['product_type', 'skin_type', 'brand']
+    list_display = ['name', 'brand', 'product_type', 'category', 'skin_type', 'price', 'avg_rating', 'rating_count', 'image']
+    list_filter = ['category', 'skin_type', 'brand']
     search_fields = ['name', 'brand', 'description']
     list_editable = ['price']
     
+    def get_search_results(self, request, queryset, search_term):
+        # Use the indexed product search instead of icontains scans
+        if not search_term:
+            return queryset, False
+        return filter_products(queryset, search_term), False
+    
     fieldsets = (
         ('Basic Information', {
             'fields': ('name', 'brand', 'product_type', 'skin_type')
@@ -58,4 +105,4 @@ class ProductAdmin(admin.ModelAdmin):
     )
 
 admin.site.register(Cart, CartAdmin)
-admin.site.register(CartItem)
\ No newline at end of file
+admin.site.register(CartItem, CartItemAdmin)
\ No newline at end of file
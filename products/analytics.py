@@ -0,0 +1,87 @@
+"""Admin dashboard analytics.
+
+``collect`` works out every dashboard metric with grouped aggregates, never
+by walking rows in Python. ``refresh_analytics`` saves the result as an
+``AnalyticsSnapshot`` so the dashboard renders from one row; staff can ask
+for live figures with ``?live=1``.
+"""
+from django.contrib.auth.models import User
+from django.db.models import Count, Q
+
+from quiz.models import SkinProfile
+
+from .models import AnalyticsSnapshot, Cart, CartItem, Product
+
+
+KEEP_SNAPSHOTS = 48
+
+
+def _percentage(part, whole):
+    return round(part / whole * 100, 1) if whole else 0
+
+
+def collect():
+    """All admin dashboard metrics as a JSON-serialisable dict"""
+    total_users = User.objects.count()
+    total_quizzes = SkinProfile.objects.count()
+
+    # Users per skin type, from their latest quiz
+    skin_type_counts = list(
+        SkinProfile.objects.values('skin_type').annotate(count=Count('id')).order_by('-count', 'skin_type')
+    )
+    top_skin_types = [row['skin_type'] for row in skin_type_counts[:3]]
+
+    category_labels = dict(Product.CATEGORY_CHOICES)
+    users_with_carts = Cart.objects.filter(items__isnull=False).values('id').distinct().count()
+
+    return {
+        'total_users': total_users,
+        'total_products': Product.objects.count(),
+        'total_quizzes': total_quizzes,
+        'total_cart_items': CartItem.objects.count(),
+
+        'skin_type_distribution': [
+            {'skin_type': row['skin_type'].title(), 'count': row['count'], 'percentage': _percentage(row['count'], total_quizzes)}
+            for row in skin_type_counts
+        ],
+        'product_types': [
+            {'category': row['category'], 'label': category_labels.get(row['category'], row['category']), 'count': row['count']}
+            for row in Product.objects.values('category').annotate(count=Count('id')).order_by('-count', 'category')[:8]
+        ],
+        'products_by_skin': list(Product.objects.values('skin_type').annotate(count=Count('id')).order_by('-count', 'skin_type')),
+        'top_brands': list(Product.objects.values('brand').annotate(product_count=Count('id')).order_by('-product_count', 'brand')[:8]),
+
+        # Best rated products for the most common skin types
+        'recommended_products': list(
+            Product.objects.filter(skin_type__in=top_skin_types)
+            .order_by('-avg_rating', '-rating_count', 'id')
+            .values('id', 'brand', 'name', 'skin_type', 'product_type')[:10]
+        ),
+        'products_in_cart': list(
+            CartItem.objects.values('product__name', 'product__brand', 'product__skin_type')
+            .annotate(times_added=Count('id'))
+            .order_by('-times_added', 'product__name')[:10]
+        ),
+
+        'recent_quiz_activity': [
+            {'username': row['user__username'], 'skin_type': row['skin_type']}
+            for row in SkinProfile.objects.order_by('-computed_at').values('user__username', 'skin_type')[:15]
+        ],
+
+        'quiz_completion_rate': _percentage(total_quizzes, total_users),
+        'cart_usage_rate': _percentage(users_with_carts, total_users),
+
+        'products_without_image': Product.objects.filter(Q(image='') | Q(image__isnull=True)).count(),
+    }
+
+
+def take_snapshot(keep=KEEP_SNAPSHOTS):
+    """Save the current metrics, dropping all but the newest ``keep`` snapshots"""
+    snapshot = AnalyticsSnapshot.objects.create(data=collect())
+    stale = AnalyticsSnapshot.objects.order_by('-created_at').values_list('id', flat=True)[keep:]
+    AnalyticsSnapshot.objects.filter(id__in=list(stale)).delete()
+    return snapshot
+
+
+def latest_snapshot():
+    return AnalyticsSnapshot.objects.order_by('-created_at').first()
@@ -0,0 +1,287 @@
+"""Cart service layer.
+
+Quantities are changed with single UPDATE statements (``quantity =
+quantity + n``) or under a row lock, never by an unlocked read-modify-write,
+so concurrent clicks and double submits cannot lose updates.
+
+``Cart.total_items`` and ``Cart.subtotal`` are stored counters, recomputed
+from the cart's rows in the same transaction that changes them, so nothing
+on the read path ever has to aggregate a cart. Every change locks the Cart
+row first, so changes to one cart apply one after another and the recount
+always sees the others' rows. Recounting rather than shifting the totals by
+the line's price means a product price change can't leave the subtotal
+permanently off; it is picked up on the cart's next change. The navbar
+badge reads the counters through a per-user cache entry (see
+``get_cart_summary``).
+"""
+from decimal import Decimal
+
+from django.core.cache import cache
+from django.db import IntegrityError, transaction
+from django.db.models import DecimalField, ExpressionWrapper, F, Sum
+from django.db.models.functions import Coalesce, Least
+
+from .models import Cart, CartItem, Product
+
+# Per product, for signed-in and guest carts alike; larger quantities are clamped
+MAX_QUANTITY = 99
+
+
+SUMMARY_CACHE_TIMEOUT = 60 * 10
+EMPTY_SUMMARY = {'total_items': 0, 'subtotal': Decimal('0.00')}
+
+
+def _summary_key(user_id):
+    return f'cart_summary:{user_id}'
+
+
+def invalidate_cart_summary(user_id):
+    """Drop the cached badge once the surrounding transaction commits"""
+    transaction.on_commit(lambda: cache.delete(_summary_key(user_id)))
+
+
+def get_cart_summary(user):
+    """Item count and subtotal for ``user``'s cart, without creating a cart"""
+    if not user.is_authenticated:
+        return EMPTY_SUMMARY
+
+    key = _summary_key(user.id)
+    summary = cache.get(key)
+    if summary is None:
+        summary = Cart.objects.filter(user=user).values('total_items', 'subtotal').first() or EMPTY_SUMMARY
+        cache.set(key, summary, SUMMARY_CACHE_TIMEOUT)
+    return summary
+
+
+def line_price(product):
+    return product.price or Decimal('0')
+
+
+def lock_cart(cart):
+    """Lock ``cart``'s row until the surrounding transaction ends"""
+    Cart.objects.select_for_update().filter(pk=cart.pk).values_list('pk', flat=True).first()
+
+
+def empty_cart(cart):
+    """Empty the cart and zero its counters"""
+    with transaction.atomic():
+        lock_cart(cart)
+        cart.items.all().delete()
+        Cart.objects.filter(pk=cart.pk).update(total_items=0, subtotal=0, version=F('version') + 1)
+        invalidate_cart_summary(cart.user_id)
+
+
+def recalculate_cart_totals(cart):
+    """Recompute the counters from the cart's items in one aggregate query"""
+    line_total = ExpressionWrapper(
+        F('quantity') * Coalesce(F('product__price'), Decimal('0')),
+        output_field=DecimalField(max_digits=12, decimal_places=2),
+    )
+    totals = cart.items.aggregate(
+        total_items=Coalesce(Sum('quantity'), 0),
+        subtotal=Coalesce(Sum(line_total), Decimal('0'), output_field=DecimalField(max_digits=12, decimal_places=2)),
+    )
+    Cart.objects.filter(pk=cart.pk).update(version=F('version') + 1, **totals)
+    invalidate_cart_summary(cart.user_id)
+    return totals
+
+
+def get_cart(user, create=True):
+    """The user's cart, optionally created on first use"""
+    if create:
+        return Cart.objects.get_or_create(user=user)[0]
+    return Cart.objects.filter(user=user).first()
+
+
+def _item_quantity(cart, product):
+    return CartItem.objects.filter(cart=cart, product=product).values_list('quantity', flat=True).first() or 0
+
+
+def add_item(cart, product, quantity=1):
+    """Add ``quantity`` units of ``product``, up to ``MAX_QUANTITY``; returns the item's new quantity"""
+    if quantity < 1:
+        raise ValueError('Quantity must be at least 1')
+
+    increment = Least(F('quantity') + quantity, MAX_QUANTITY)
+    with transaction.atomic():
+        lock_cart(cart)
+        updated = CartItem.objects.filter(cart=cart, product=product).update(quantity=increment)
+        if not updated:
+            try:
+                with transaction.atomic():
+                    CartItem.objects.create(cart=cart, product=product, quantity=min(quantity, MAX_QUANTITY))
+            except IntegrityError:
+                # Another request inserted the row first; fall back to incrementing it
+                CartItem.objects.filter(cart=cart, product=product).update(quantity=increment)
+        recalculate_cart_totals(cart)
+    return _item_quantity(cart, product)
+
+
+def remove_units(cart, product, quantity=1):
+    """
+    Take ``quantity`` units of ``product`` out of the cart; returns the new quantity.
+
+    The row is locked and read first, then either decremented or, if it
+    would not stay positive, deleted. Deciding on the locked quantity means
+    units added concurrently are never deleted along with the row.
+    """
+    if quantity < 1:
+        raise ValueError('Quantity must be at least 1')
+
+    with transaction.atomic():
+        lock_cart(cart)
+        item = CartItem.objects.select_for_update().filter(cart=cart, product=product).first()
+        if item is None:
+            return 0
+        if item.quantity > quantity:
+            CartItem.objects.filter(pk=item.pk).update(quantity=F('quantity') - quantity)
+            recalculate_cart_totals(cart)
+            return item.quantity - quantity
+
+        item.delete()
+        recalculate_cart_totals(cart)
+    return 0
+
+
+def remove_item(cart, product):
+    """Drop ``product`` from the cart entirely"""
+    with transaction.atomic():
+        lock_cart(cart)
+        item = CartItem.objects.select_for_update().filter(cart=cart, product=product).first()
+        if item is not None:
+            item.delete()
+            recalculate_cart_totals(cart)
+
+
+def set_quantity(cart, product, quantity):
+    """Set ``product``'s quantity outright (at most ``MAX_QUANTITY``); zero removes it. Returns the new quantity."""
+    if quantity < 0:
+        raise ValueError('Quantity cannot be negative')
+    quantity = min(quantity, MAX_QUANTITY)
+    if quantity == 0:
+        remove_item(cart, product)
+        return 0
+
+    with transaction.atomic():
+        lock_cart(cart)
+        item = CartItem.objects.select_for_update().filter(cart=cart, product=product).first()
+        if item is None:
+            return add_item(cart, product, quantity)
+        if quantity != item.quantity:
+            CartItem.objects.filter(pk=item.pk).update(quantity=quantity)
+            recalculate_cart_totals(cart)
+    return quantity
+
+
+def bulk_set_quantities(cart, quantities):
+    """
+    Apply ``{product: quantity}`` in one transaction.
+
+    Existing rows are locked and read once, then updated, created and deleted
+    in bulk; the counters are recounted once at the end.
+    """
+    with transaction.atomic():
+        lock_cart(cart)
+        existing = {
+            item.product_id: item
+            for item in CartItem.objects.select_for_update().filter(cart=cart, product__in=list(quantities))
+        }
+        to_create, to_update, to_delete = [], [], []
+        for product, quantity in quantities.items():
+            if quantity < 0:
+                raise ValueError('Quantity cannot be negative')
+            quantity = min(quantity, MAX_QUANTITY)
+            item = existing.get(product.id)
+            if quantity == (item.quantity if item else 0):
+                continue
+            if item is None:
+                to_create.append(CartItem(cart=cart, product=product, quantity=quantity))
+            elif quantity == 0:
+                to_delete.append(item.pk)
+            else:
+                item.quantity = quantity
+                to_update.append(item)
+
+        CartItem.objects.bulk_create(to_create)
+        CartItem.objects.bulk_update(to_update, ['quantity'])
+        CartItem.objects.filter(pk__in=to_delete).delete()
+        if to_create or to_update or to_delete:
+            recalculate_cart_totals(cart)
+
+
+def merge_guest_items(user, quantities):
+    """
+    Fold a guest cart's ``{product_id: quantity}`` into ``user``'s cart.
+
+    Quantities are added to any the user already has, written with a single
+    INSERT ... ON CONFLICT upsert, and the counters rebuilt once.
+    """
+    if not quantities:
+        return
+    product_ids = list(Product.objects.filter(id__in=list(quantities)).values_list('id', flat=True))
+    if not product_ids:
+        return
+
+    with transaction.atomic():
+        cart = get_cart(user)
+        lock_cart(cart)
+        existing = dict(
+            CartItem.objects.select_for_update()
+            .filter(cart=cart, product_id__in=product_ids)
+            .values_list('product_id', 'quantity')
+        )
+        rows = [
+            CartItem(cart=cart, product_id=product_id,
+                     quantity=min(existing.get(product_id, 0) + quantities[product_id], MAX_QUANTITY))
+            for product_id in product_ids
+        ]
+        CartItem.objects.bulk_create(
+            rows,
+            update_conflicts=True,
+            unique_fields=['cart', 'product'],
+            update_fields=['quantity'],
+        )
+        recalculate_cart_totals(cart)
+
+
+class UserCart:
+    """A signed-in user's Cart behind the same interface as ``GuestCart``"""
+
+    def __init__(self, user):
+        self.user = user
+        self._cart = None
+
+    @property
+    def cart(self):
+        if self._cart is None:
+            self._cart = get_cart(self.user)
+        return self._cart
+
+    def add_item(self, product, quantity=1):
+        return add_item(self.cart, product, quantity)
+
+    def remove_units(self, product, quantity=1):
+        return remove_units(self.cart, product, quantity)
+
+    def remove_item(self, product):
+        remove_item(self.cart, product)
+
+    def set_quantity(self, product, quantity):
+        return set_quantity(self.cart, product, quantity)
+
+    def bulk_set_quantities(self, quantities):
+        bulk_set_quantities(self.cart, quantities)
+
+    def empty(self):
+        empty_cart(self.cart)
+
+    def totals(self):
+        self.cart.refresh_from_db(fields=['total_items', 'subtotal'])
+        return {'total_items': self.cart.total_items, 'subtotal': self.cart.subtotal}
+
+
+def active_cart(request):
+    """The cart for this request: the user's Cart, or the guest cookie cart"""
+    if request.user.is_authenticated:
+        return UserCart(request.user)
+    return request.guest_cart
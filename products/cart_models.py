@@ -1,33 +0,0 @@
-from django.db import models
-from django.contrib.auth.models import User
-
-class Cart(models.Model):
-    user = models.ForeignKey(User, on_delete=models.CASCADE)
-    created_at = models.DateTimeField(auto_now_add=True)
-    updated_at = models.DateTimeField(auto_now=True)
-
-    def __str__(self):
-        return f"Cart - {self.user.username}"
-
-    def get_total_items(self):
-        return sum(item.quantity for item in self.items.all())
-
-    def get_total_price(self):
-        return sum(item.get_total_price() for item in self.items.all())
-
-
-class CartItem(models.Model):
-    cart = models.ForeignKey(Cart, related_name='items', on_delete=models.CASCADE)
-    product = models.ForeignKey('products.Product', on_delete=models.CASCADE)
-    quantity = models.PositiveIntegerField(default=1)
-    added_at = models.DateTimeField(auto_now_add=True)
-
-    def __str__(self):
-        return f"{self.product.name} x {self.quantity}"
-
-    def get_total_price(self):
-        # If you add price field to Product model later, calculate: self.product.price * self.quantity
-        return 0  # Placeholder for now
-
-    class Meta:
-        unique_together = ('cart', 'product')
@@ -0,0 +1,57 @@
+"""Product category classifier.
+
+``Product.product_type`` is free text ('Day Cream', 'Night Serum', 'Balm').
+``classify`` maps it onto the fixed ``Product.category`` values so routine
+slots, admin filters and reports can use indexed equality lookups. It runs
+on every save (see ``products.signals``); ``python manage.py
+classify_products`` re-runs it over existing rows after the rules change.
+"""
+import re
+
+from django.db import transaction
+
+from .models import Product
+
+
+# Checked in order; the first category with a matching keyword wins
+CATEGORY_KEYWORDS = [
+    (Product.CATEGORY_SUNSCREEN, ['sunscreen', 'sunblock', 'spf', 'sun protect']),
+    (Product.CATEGORY_CLEANSER, ['cleanser', 'cleansing', 'face wash', 'facewash', 'micellar']),
+    (Product.CATEGORY_MASK, ['mask']),
+    (Product.CATEGORY_EXFOLIATOR, ['exfoliat', 'foliant', 'scrub', 'peel']),
+    (Product.CATEGORY_TONER, ['toner', 'essence', 'mist']),
+    (Product.CATEGORY_SERUM, ['serum', 'ampoule', 'concentrate']),
+    (Product.CATEGORY_MOISTURIZER, ['moisturi', 'cream', 'lotion', 'gel', 'balm', 'baume', 'hydrator', 'emulsion']),
+    (Product.CATEGORY_TREATMENT, ['treatment', 'spot', 'acne']),
+]
+
+_RULES = [
+    (category, re.compile('|'.join(re.escape(keyword) for keyword in keywords)))
+    for category, keywords in CATEGORY_KEYWORDS
+]
+
+
+def _match(text):
+    text = (text or '').lower()
+    for category, pattern in _RULES:
+        if pattern.search(text):
+            return category
+    return None
+
+
+def classify(product_type, name=''):
+    """Category for a product, judged by its type and then, failing that, its name"""
+    return _match(product_type) or _match(name) or Product.CATEGORY_OTHER
+
+
+def classify_products(batch_size=500):
+    """Re-classify every product, writing only rows whose category changes; returns that count"""
+    changed = []
+    for product in Product.objects.only('id', 'name', 'product_type', 'category').iterator(chunk_size=batch_size):
+        category = classify(product.product_type, product.name)
+        if category != product.category:
+            product.category = category
+            changed.append(product)
+    with transaction.atomic():
+        Product.objects.bulk_update(changed, ['category'], batch_size=batch_size)
+    return len(changed)
@@ -0,0 +1,163 @@
+"""Community hub caching.
+
+Every section of the community hub is the same for all visitors, so each is
+cached under a key that embeds a version number per content group
+(``reviews``, ``routines``). Writes never delete keys; the signal receivers
+bump the group's version once the transaction commits, and every key built
+from the old version simply stops being read and ages out.
+
+The template also caches the rendered HTML of each section with the same
+versions. Sections are handed to it lazily, so when a fragment is cached the
+section data is not even fetched.
+
+Only ``get``/``set``/``add``/``incr`` are used, so the default local-memory
+cache can be swapped for Redis (see ``CACHES`` in settings) without changes.
+"""
+import time
+
+from django.core.cache import cache
+from django.db import transaction
+from django.utils.functional import SimpleLazyObject
+
+from .models import Product, ProductReview, UserRoutine
+
+
+CACHE_TIMEOUT = 60 * 5
+VERSION_GROUPS = ('reviews', 'routines')
+STATS_KEY = 'community:stats'
+
+
+def _recent_reviews():
+    return list(ProductReview.objects.select_related('user', 'product').all()[:10])
+
+
+def _popular_routines():
+    return list(
+        UserRoutine.objects.filter(is_public=True).select_related('user').order_by('-likes_count', '-views_count')[:8]
+    )
+
+
+def _top_products():
+    # Rating aggregates are maintained on Product, see products.ratings
+    return list(Product.objects.filter(avg_rating__gt=0).order_by('-avg_rating', '-rating_count')[:6])
+
+
+def _statistics():
+    return {
+        'total_reviews': ProductReview.objects.count(),
+        'total_routines': UserRoutine.objects.filter(is_public=True).count(),
+        'total_members': ProductReview.objects.values('user').distinct().count(),
+    }
+
+
+# section -> (version groups it depends on, loader)
+SECTIONS = {
+    'recent_reviews': (('reviews',), _recent_reviews),
+    'popular_routines': (('routines',), _popular_routines),
+    'top_products': (('reviews',), _top_products),
+    'statistics': (('reviews', 'routines'), _statistics),
+}
+
+
+# Versions
+
+def _version_key(group):
+    return f'community:version:{group}'
+
+
+def _initial_version():
+    # Millisecond clock, so a version lost to eviction never restarts below an old one
+    return int(time.time() * 1000)
+
+
+def get_versions():
+    """Current version of every content group, initialising any that are missing"""
+    keys = {group: _version_key(group) for group in VERSION_GROUPS}
+    found = cache.get_many(list(keys.values()))
+    versions = {}
+    for group, key in keys.items():
+        if key not in found:
+            cache.add(key, _initial_version(), None)
+            found[key] = cache.get(key)
+        versions[group] = found[key]
+    return versions
+
+
+def invalidate(*groups):
+    """Move ``groups`` to a new version once the surrounding transaction commits"""
+    def bump():
+        for group in groups:
+            key = _version_key(group)
+            try:
+                cache.incr(key)
+            except ValueError:
+                cache.set(key, _initial_version(), None)
+
+    transaction.on_commit(bump)
+
+
+# Hit/miss counters
+
+def _incr(key):
+    try:
+        cache.incr(key)
+    except ValueError:
+        if not cache.add(key, 1, None):
+            cache.incr(key)
+
+
+def cache_stats():
+    """
+    Per-section ``hits``/``misses`` of the data cache, plus ``fragment_hits``:
+    page views where the rendered section came from the template cache.
+    """
+    names = list(SECTIONS)
+    keys = [f'{STATS_KEY}:views'] + [f'{STATS_KEY}:{name}:{kind}' for name in names for kind in ('hits', 'misses')]
+    counts = cache.get_many(keys)
+    views = counts.get(f'{STATS_KEY}:views', 0)
+    stats = {'views': views, 'sections': {}}
+    for name in names:
+        hits = counts.get(f'{STATS_KEY}:{name}:hits', 0)
+        misses = counts.get(f'{STATS_KEY}:{name}:misses', 0)
+        fragment_hits = max(views - hits - misses, 0)
+        stats['sections'][name] = {
+            'hits': hits,
+            'misses': misses,
+            'fragment_hits': fragment_hits,
+            'hit_ratio': round((hits + fragment_hits) / views, 3) if views else None,
+        }
+    return stats
+
+
+def reset_cache_stats():
+    keys = [f'{STATS_KEY}:views'] + [f'{STATS_KEY}:{name}:{kind}' for name in SECTIONS for kind in ('hits', 'misses')]
+    cache.delete_many(keys)
+
+
+# Sections
+
+def section_key(name, versions):
+    groups, _ = SECTIONS[name]
+    return f'community:{name}:' + ':'.join(str(versions[group]) for group in groups)
+
+
+def get_section(name, versions):
+    key = section_key(name, versions)
+    value = cache.get(key)
+    if value is None:
+        _incr(f'{STATS_KEY}:{name}:misses')
+        value = SECTIONS[name][1]()
+        cache.set(key, value, CACHE_TIMEOUT)
+    else:
+        _incr(f'{STATS_KEY}:{name}:hits')
+    return value
+
+
+def hub_context():
+    """Template context for the community hub; each section loads on first use"""
+    versions = get_versions()
+    _incr(f'{STATS_KEY}:views')
+    context = {'versions': versions, 'cache_timeout': CACHE_TIMEOUT}
+    for name in SECTIONS:
+        context[name] = SimpleLazyObject(lambda name=name: get_section(name, versions))
+    return context
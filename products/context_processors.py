@@ -0,0 +1,15 @@
+from django.utils.functional import SimpleLazyObject
+
+from .cart import EMPTY_SUMMARY, get_cart_summary
+
+
+def _summary(request):
+    if request.user.is_authenticated:
+        return get_cart_summary(request.user)
+    guest_cart = getattr(request, 'guest_cart', None)
+    return guest_cart.summary() if guest_cart is not None else EMPTY_SUMMARY
+
+
+def cart_summary(request):
+    """Cart badge data for every template; only loaded when a template uses it"""
+    return {'cart_summary': SimpleLazyObject(lambda: _summary(request))}
@@ -0,0 +1,59 @@
+"""Likes and helpful votes.
+
+A toggle inserts or deletes the vote row and shifts the denormalised counter
+with ``F()`` in the same transaction, so concurrent votes can neither lose
+increments nor double count. ``reconcile_counters`` recomputes the counters
+from the vote tables if they ever drift (raw SQL, admin edits, restores).
+"""
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from .models import ProductReview, ReviewHelpful, RoutineLike, UserRoutine
+
+
+def _toggle(vote_model, target_model, target_field, counter, target_id, user):
+    """Flip ``user``'s vote on a target; returns True if the vote now exists"""
+    votes = vote_model.objects.filter(**{target_field: target_id}, user=user)
+    targets = target_model.objects.filter(pk=target_id)
+    with transaction.atomic():
+        deleted, _ = votes.delete()
+        if deleted:
+            targets.filter(**{f'{counter}__gt': 0}).update(**{counter: F(counter) - 1})
+            return False
+        try:
+            with transaction.atomic():
+                vote_model.objects.create(**{target_field: target_id}, user=user)
+        except IntegrityError:
+            # A concurrent request from the same user voted first
+            return True
+        targets.update(**{counter: F(counter) + 1})
+        return True
+
+
+def toggle_routine_like(routine, user):
+    return _toggle(RoutineLike, UserRoutine, 'routine_id', 'likes_count', routine.pk, user)
+
+
+def toggle_review_helpful(review, user):
+    return _toggle(ReviewHelpful, ProductReview, 'review_id', 'helpful_count', review.pk, user)
+
+
+def _reconcile(target_model, counter, vote_model, target_field):
+    votes = (
+        vote_model.objects.filter(**{target_field: OuterRef('pk')})
+        .order_by().values(target_field).annotate(total=Count('id')).values('total')
+    )
+    actual = Coalesce(Subquery(votes), 0, output_field=IntegerField())
+    drifted = target_model.objects.annotate(actual=actual).exclude(**{counter: F('actual')})
+    return target_model.objects.filter(pk__in=drifted.values('pk')).update(**{counter: actual})
+
+
+def reconcile_like_counts():
+    """Reset every routine's ``likes_count`` that disagrees with its likes; returns the rows fixed"""
+    return _reconcile(UserRoutine, 'likes_count', RoutineLike, 'routine')
+
+
+def reconcile_helpful_counts():
+    """Reset every review's ``helpful_count`` that disagrees with its votes; returns the rows fixed"""
+    return _reconcile(ProductReview, 'helpful_count', ReviewHelpful, 'review')
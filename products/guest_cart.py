@@ -0,0 +1,143 @@
+"""Guest cart kept in a signed cookie.
+
+Anonymous shoppers get a cart without any database writes: the
+``{product_id: quantity}`` map lives in a signed cookie that
+``GuestCartMiddleware`` writes back only when it changed. On login the
+``user_logged_in`` receiver folds it into the user's Cart with one bulk
+upsert (see ``products.cart.merge_guest_items``).
+"""
+import json
+from decimal import Decimal
+
+from django.conf import settings
+
+from .cart import MAX_QUANTITY, line_price
+from .models import Product
+
+
+COOKIE_NAME = 'guest_cart'
+COOKIE_SALT = 'products.guest_cart'
+COOKIE_MAX_AGE = 60 * 60 * 24 * 30
+MAX_GUEST_ITEMS = 50
+
+
+class GuestCartItem:
+    """Cart line for a guest; ``id`` is the product id since there is no CartItem row"""
+
+    def __init__(self, product, quantity):
+        self.id = product.id
+        self.product = product
+        self.quantity = quantity
+
+    def get_total_price(self):
+        return line_price(self.product) * self.quantity
+
+
+class GuestCart:
+    """Cookie-backed cart exposing the same operations as ``products.cart.UserCart``"""
+
+    def __init__(self, request):
+        self._request = request
+        self._items = None
+        self.modified = False
+
+    @property
+    def quantities(self):
+        if self._items is None:
+            self._items = self._load()
+        return self._items
+
+    def _load(self):
+        raw = self._request.get_signed_cookie(COOKIE_NAME, default=None, salt=COOKIE_SALT, max_age=COOKIE_MAX_AGE)
+        if not raw:
+            return {}
+        try:
+            data = json.loads(raw)
+        except ValueError:
+            return {}
+        if not isinstance(data, dict):
+            return {}
+        items = {}
+        for product_id, quantity in data.items():
+            if str(product_id).isdigit() and isinstance(quantity, int) and 0 < quantity <= MAX_QUANTITY:
+                items[int(product_id)] = quantity
+        return items
+
+    def _set(self, product_id, quantity):
+        items = self.quantities
+        if quantity > 0:
+            if product_id not in items and len(items) >= MAX_GUEST_ITEMS:
+                raise ValueError(f'A guest cart can hold at most {MAX_GUEST_ITEMS} products')
+            items[product_id] = min(quantity, MAX_QUANTITY)
+        else:
+            items.pop(product_id, None)
+        self.modified = True
+        return items.get(product_id, 0)
+
+    def add_item(self, product, quantity=1):
+        if quantity < 1:
+            raise ValueError('Quantity must be at least 1')
+        return self._set(product.id, self.quantities.get(product.id, 0) + quantity)
+
+    def remove_units(self, product, quantity=1):
+        if quantity < 1:
+            raise ValueError('Quantity must be at least 1')
+        return self._set(product.id, self.quantities.get(product.id, 0) - quantity)
+
+    def remove_item(self, product):
+        self._set(product.id, 0)
+
+    def set_quantity(self, product, quantity):
+        if quantity < 0:
+            raise ValueError('Quantity cannot be negative')
+        return self._set(product.id, quantity)
+
+    def bulk_set_quantities(self, quantities):
+        for product, quantity in quantities.items():
+            self.set_quantity(product, quantity)
+
+    def empty(self):
+        if self.quantities:
+            self._items = {}
+            self.modified = True
+
+    def get_total_items(self):
+        return sum(self.quantities.values())
+
+    def items(self):
+        """Cart lines with their products, in the order they were added"""
+        products = Product.objects.in_bulk(list(self.quantities))
+        return [
+            GuestCartItem(products[product_id], quantity)
+            for product_id, quantity in self.quantities.items()
+            if product_id in products
+        ]
+
+    def summary(self):
+        """Badge data; guest subtotals are only priced on the cart page"""
+        return {'total_items': self.get_total_items(), 'subtotal': None}
+
+    def totals(self):
+        items = self.items()
+        return {
+            'total_items': sum(item.quantity for item in items),
+            'subtotal': sum((item.get_total_price() for item in items), Decimal('0')),
+        }
+
+    def persist(self, response):
+        """Write the cookie back if anything changed during the request"""
+        if not self.modified:
+            return
+        if not self.quantities:
+            response.delete_cookie(COOKIE_NAME)
+            return
+        value = json.dumps({str(pid): qty for pid, qty in self.quantities.items()}, separators=(',', ':'))
+        response.set_signed_cookie(
+            COOKIE_NAME,
+            value,
+            salt=COOKIE_SALT,
+            max_age=COOKIE_MAX_AGE,
+            httponly=True,
+            samesite='Lax',
+            secure=getattr(settings, 'SESSION_COOKIE_SECURE', False),
+        )
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+from products.categories import classify_products
+from quiz.recommendations import bump_catalog_version
+
+
+class Command(BaseCommand):
+    help = 'Assign every product its normalised category from its product type'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500, help='Rows read and written per batch')
+
+    def handle(self, *args, **options):
+        changed = classify_products(batch_size=options['batch_size'])
+        if changed:
+            # bulk_update skips the Product signals, so retire cached recommendations here
+            bump_catalog_version()
+        self.stdout.write(self.style.SUCCESS(f'✅ Updated the category of {changed} products!'))
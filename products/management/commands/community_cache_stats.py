@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+from products.community import cache_stats, reset_cache_stats
+
+
+class Command(BaseCommand):
+    help = 'Show how often the community hub is served from cache'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--reset', action='store_true', help='Zero the counters after printing them')
+
+    def handle(self, *args, **options):
+        stats = cache_stats()
+        self.stdout.write(f"Community hub views: {stats['views']}")
+        for name, section in stats['sections'].items():
+            ratio = 'n/a' if section['hit_ratio'] is None else f"{section['hit_ratio']:.1%}"
+            self.stdout.write(
+                f"  {name:<18} fragment hits {section['fragment_hits']:>6}  "
+                f"data hits {section['hits']:>6}  misses {section['misses']:>6}  hit ratio {ratio}"
+            )
+        if options['reset']:
+            reset_cache_stats()
+            self.stdout.write(self.style.SUCCESS('✅ Counters reset!'))
@@ -0,0 +1,29 @@
+import time
+
+from django.core.management.base import BaseCommand
+from products.webhooks import process_due_events
+
+
+class Command(BaseCommand):
+    help = 'Process queued Razorpay webhook events, retrying failures with backoff'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=100, help='Events claimed per transaction')
+        parser.add_argument('--loop', action='store_true', help='Keep polling instead of exiting once the queue is drained')
+        parser.add_argument('--interval', type=float, default=2.0, help='Seconds to sleep between polls when idle')
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        total = 0
+        while True:
+            counts = process_due_events(batch_size=batch_size)
+            handled = sum(counts.values())
+            total += handled
+            if handled:
+                summary = ', '.join(f'{count} {status}' for status, count in sorted(counts.items()))
+                self.stdout.write(f'Processed {handled} events ({summary})')
+            if handled < batch_size:
+                if not options['loop']:
+                    break
+                time.sleep(options['interval'])
+        self.stdout.write(self.style.SUCCESS(f'✅ Done, {total} events processed!'))
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+from products.search import rebuild_index, uses_postgres
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the product search index (search vectors on PostgreSQL, token index elsewhere)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000, help='Rows written per batch')
+
+    def handle(self, *args, **options):
+        count = rebuild_index(batch_size=options['batch_size'])
+        backend = 'search vectors' if uses_postgres() else 'token index'
+        self.stdout.write(self.style.SUCCESS(f'✅ Rebuilt {backend} for {count} products!'))
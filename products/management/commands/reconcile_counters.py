@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+from products.engagement import reconcile_helpful_counts, reconcile_like_counts
+from products.ratings import recalculate_product_ratings
+from products.site_counts import reconcile as reconcile_site_counts
+
+
+class Command(BaseCommand):
+    help = 'Recompute routine likes, review helpful votes, product rating aggregates and the cached dashboard counts from their source tables'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--skip-ratings', action='store_true', help='Leave product rating aggregates alone')
+
+    def handle(self, *args, **options):
+        likes = reconcile_like_counts()
+        self.stdout.write(f'Routine likes: fixed {likes} routines')
+        helpful = reconcile_helpful_counts()
+        self.stdout.write(f'Helpful votes: fixed {helpful} reviews')
+        if not options['skip_ratings']:
+            products = recalculate_product_ratings()
+            self.stdout.write(f'Rating aggregates: refreshed {products} products')
+        counts = reconcile_site_counts()
+        self.stdout.write('Dashboard counts: ' + ', '.join(f'{name} {value}' for name, value in counts.items()))
+        self.stdout.write(self.style.SUCCESS('✅ Counters reconciled!'))
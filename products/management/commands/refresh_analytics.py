@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+from products.analytics import KEEP_SNAPSHOTS, take_snapshot
+
+
+class Command(BaseCommand):
+    help = 'Recompute the admin dashboard metrics and save them as a new analytics snapshot'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--keep', type=int, default=KEEP_SNAPSHOTS, help='Number of recent snapshots to keep')
+
+    def handle(self, *args, **options):
+        snapshot = take_snapshot(keep=max(options['keep'], 1))
+        self.stdout.write(self.style.SUCCESS(f'✅ Saved analytics snapshot from {snapshot.created_at:%Y-%m-%d %H:%M}!'))
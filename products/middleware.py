@@ -0,0 +1,14 @@
+from .guest_cart import GuestCart
+
+
+class GuestCartMiddleware:
+    """Attach ``request.guest_cart`` and write its cookie back when it changes"""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        request.guest_cart = GuestCart(request)
+        response = self.get_response(request)
+        request.guest_cart.persist(response)
+        return response
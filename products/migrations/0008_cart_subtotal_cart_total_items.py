@@ -0,0 +1,42 @@
+# Generated by Django 4.2 on 2026-10-18 18:22
+
+from decimal import Decimal
+
+from django.db import migrations, models
+from django.db.models import DecimalField, ExpressionWrapper, F, Sum
+from django.db.models.functions import Coalesce
+
+
+def backfill_cart_totals(apps, schema_editor):
+    Cart = apps.get_model('products', 'Cart')
+    line_total = ExpressionWrapper(
+        F('items__quantity') * Coalesce(F('items__product__price'), Decimal('0')),
+        output_field=DecimalField(max_digits=12, decimal_places=2),
+    )
+    totals = Cart.objects.annotate(
+        item_count=Sum('items__quantity'),
+        item_subtotal=Sum(line_total),
+    ).filter(item_count__gt=0)
+    for cart in totals.iterator():
+        Cart.objects.filter(pk=cart.pk).update(total_items=cart.item_count, subtotal=cart.item_subtotal or 0)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0007_product_search_vector_productsearchtoken'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='cart',
+            name='subtotal',
+            field=models.DecimalField(decimal_places=2, default=0, help_text='Subtotal in INR', max_digits=12),
+        ),
+        migrations.AddField(
+            model_name='cart',
+            name='total_items',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(backfill_cart_totals, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2 on 2026-10-18 18:27
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0009_order_cart_version_orderitem_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='order',
+            name='checkout_key',
+            field=models.CharField(blank=True, db_index=True, max_length=64),
+        ),
+    ]
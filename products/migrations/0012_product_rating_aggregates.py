@@ -0,0 +1,76 @@
+# Generated by Django 4.2 on 2026-10-18 18:31
+
+from django.db import migrations, models
+from django.db.models import Count, Sum
+
+
+def backfill_product_ratings(apps, schema_editor):
+    Product = apps.get_model('products', 'Product')
+    ProductReview = apps.get_model('products', 'ProductReview')
+    totals = ProductReview.objects.values('product_id').annotate(
+        count=Count('id'),
+        rating=Sum('rating'),
+        effectiveness=Sum('effectiveness'),
+        value_for_money=Sum('value_for_money'),
+    ).order_by()
+    for row in totals.iterator():
+        count = row['count']
+        Product.objects.filter(pk=row['product_id']).update(
+            rating_count=count,
+            rating_sum=row['rating'],
+            effectiveness_sum=row['effectiveness'],
+            value_for_money_sum=row['value_for_money'],
+            avg_rating=row['rating'] / count,
+            avg_effectiveness=row['effectiveness'] / count,
+            avg_value_for_money=row['value_for_money'] / count,
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0011_paymentevent'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='avg_effectiveness',
+            field=models.FloatField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='avg_rating',
+            field=models.FloatField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='avg_value_for_money',
+            field=models.FloatField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='effectiveness_sum',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='rating_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='rating_sum',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='value_for_money_sum',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['-avg_rating', '-rating_count'], name='product_avg_rating_idx'),
+        ),
+        migrations.RunPython(backfill_product_ratings, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,56 @@
+# Generated by Django 4.2 on 2026-10-18 18:38
+
+from django.db import migrations, models
+
+# Frozen copy of products.categories.CATEGORY_KEYWORDS as it stood for this migration
+CATEGORY_KEYWORDS = [
+    ('sunscreen', ['sunscreen', 'sunblock', 'spf', 'sun protect']),
+    ('cleanser', ['cleanser', 'cleansing', 'face wash', 'facewash', 'micellar']),
+    ('mask', ['mask']),
+    ('exfoliator', ['exfoliat', 'foliant', 'scrub', 'peel']),
+    ('toner', ['toner', 'essence', 'mist']),
+    ('serum', ['serum', 'ampoule', 'concentrate']),
+    ('moisturizer', ['moisturi', 'cream', 'lotion', 'gel', 'balm', 'baume', 'hydrator', 'emulsion']),
+    ('treatment', ['treatment', 'spot', 'acne']),
+]
+
+
+def _match(text):
+    text = (text or '').lower()
+    for category, keywords in CATEGORY_KEYWORDS:
+        if any(keyword in text for keyword in keywords):
+            return category
+    return None
+
+
+def classify_existing_products(apps, schema_editor, batch_size=500):
+    Product = apps.get_model('products', 'Product')
+    batch = []
+    for product in Product.objects.only('id', 'name', 'product_type').iterator(chunk_size=batch_size):
+        product.category = _match(product.product_type) or _match(product.name) or 'other'
+        if product.category != 'other':
+            batch.append(product)
+        if len(batch) >= batch_size:
+            Product.objects.bulk_update(batch, ['category'])
+            batch = []
+    Product.objects.bulk_update(batch, ['category'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0012_product_rating_aggregates'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='category',
+            field=models.CharField(choices=[('cleanser', 'Cleanser'), ('toner', 'Toner'), ('serum', 'Serum'), ('moisturizer', 'Moisturizer'), ('sunscreen', 'Sunscreen'), ('mask', 'Mask'), ('exfoliator', 'Exfoliator'), ('treatment', 'Treatment'), ('other', 'Other')], default='other', editable=False, max_length=20),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['category', 'skin_type', 'id'], name='product_category_skin_idx'),
+        ),
+        migrations.RunPython(classify_existing_products, migrations.RunPython.noop),
+    ]
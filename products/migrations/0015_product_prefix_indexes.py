@@ -0,0 +1,44 @@
+# Generated by Django 4.2 on 2026-10-18 21:05
+
+from django.db import migrations
+
+
+PREFIX_INDEXES = {
+    'product_name_upper_prefix_idx': 'name',
+    'product_brand_upper_prefix_idx': 'brand',
+}
+
+
+def create_prefix_indexes(apps, schema_editor):
+    """
+    Indexes for the autocomplete's case-insensitive prefix match.
+
+    On PostgreSQL ``name__istartswith`` compiles to ``UPPER(name::text) LIKE
+    UPPER('abc%')``, which only an index on that exact expression can serve;
+    ``text_pattern_ops`` lets it answer LIKE under any collation.
+    """
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for index, column in PREFIX_INDEXES.items():
+        schema_editor.execute(
+            f'CREATE INDEX IF NOT EXISTS {index} '
+            f'ON products_product (UPPER({column}::text) text_pattern_ops)'
+        )
+
+
+def drop_prefix_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for index in PREFIX_INDEXES:
+        schema_editor.execute(f'DROP INDEX IF EXISTS {index}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0014_analyticssnapshot'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_prefix_indexes, drop_prefix_indexes),
+    ]
@@ -1,19 +1,82 @@
 from django.db import models
 from django.contrib.auth.models import User
+from django.contrib.postgres.search import SearchVectorField
+from django.core.serializers.json import DjangoJSONEncoder
+from django.utils import timezone
 
 class Product(models.Model):
+    CATEGORY_CLEANSER = 'cleanser'
+    CATEGORY_TONER = 'toner'
+    CATEGORY_SERUM = 'serum'
+    CATEGORY_MOISTURIZER = 'moisturizer'
+    CATEGORY_SUNSCREEN = 'sunscreen'
+    CATEGORY_MASK = 'mask'
+    CATEGORY_EXFOLIATOR = 'exfoliator'
+    CATEGORY_TREATMENT = 'treatment'
+    CATEGORY_OTHER = 'other'
+    CATEGORY_CHOICES = [
+        (CATEGORY_CLEANSER, 'Cleanser'),
+        (CATEGORY_TONER, 'Toner'),
+        (CATEGORY_SERUM, 'Serum'),
+        (CATEGORY_MOISTURIZER, 'Moisturizer'),
+        (CATEGORY_SUNSCREEN, 'Sunscreen'),
+        (CATEGORY_MASK, 'Mask'),
+        (CATEGORY_EXFOLIATOR, 'Exfoliator'),
+        (CATEGORY_TREATMENT, 'Treatment'),
+        (CATEGORY_OTHER, 'Other'),
+    ]
+
     name = models.CharField(max_length=100)
     brand = models.CharField(max_length=100)
     product_type = models.CharField(max_length=50)
+    # Normalised from product_type by products.categories on every save
+    category = models.CharField(max_length=20, choices=CATEGORY_CHOICES, default=CATEGORY_OTHER, editable=False)
     skin_type = models.CharField(max_length=20)
     description = models.TextField()
     image = models.ImageField(upload_to='product_images/', blank=True, null=True)
     price = models.DecimalField(max_digits=10, decimal_places=2, help_text="Price in INR", null=True, blank=True)
 
+    # Maintained by products.search; only populated on PostgreSQL
+    search_vector = SearchVectorField(null=True, editable=False)
+
+    # Review aggregates, kept current by products.ratings as reviews change
+    rating_count = models.PositiveIntegerField(default=0, editable=False)
+    rating_sum = models.PositiveIntegerField(default=0, editable=False)
+    effectiveness_sum = models.PositiveIntegerField(default=0, editable=False)
+    value_for_money_sum = models.PositiveIntegerField(default=0, editable=False)
+    avg_rating = models.FloatField(default=0, editable=False)
+    avg_effectiveness = models.FloatField(default=0, editable=False)
+    avg_value_for_money = models.FloatField(default=0, editable=False)
+
+    class Meta:
+        # (sort key, id) pairs back the keyset pagination in products.pagination
+        indexes = [
+            models.Index(fields=['skin_type', 'id'], name='product_skin_type_id_idx'),
+            models.Index(fields=['category', 'skin_type', 'id'], name='product_category_skin_idx'),
+            models.Index(fields=['name', 'id'], name='product_name_id_idx'),
+            models.Index(fields=['brand', 'id'], name='product_brand_id_idx'),
+            models.Index(fields=['price', 'id'], name='product_price_id_idx'),
+            # Top rated products: WHERE avg_rating > 0 ORDER BY avg_rating DESC, rating_count DESC
+            models.Index(fields=['-avg_rating', '-rating_count'], name='product_avg_rating_idx'),
+        ]
+
     def __str__(self):
         return f"{self.brand} - {self.name}"
 
 
+class ProductSearchToken(models.Model):
+    """Inverted index entry used for product search when not running on PostgreSQL"""
+    token = models.CharField(max_length=50)
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='search_tokens')
+    weight = models.FloatField()
+
+    class Meta:
+        unique_together = ('token', 'product')
+
+    def __str__(self):
+        return f"{self.token} -> {self.product_id}"
+
+
 class SkincareReminder(models.Model):
     """Reminders for skincare routines"""
     REMINDER_TYPES = [
@@ -62,11 +125,17 @@ class Cart(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    # Running totals maintained by products.cart whenever items change
+    total_items = models.PositiveIntegerField(default=0)
+    subtotal = models.DecimalField(max_digits=12, decimal_places=2, default=0, help_text="Subtotal in INR")
+    # Bumped on every change so checkout can tell whether an order snapshot is still current
+    version = models.PositiveIntegerField(default=0)
+
     def __str__(self):
         return f"Cart - {self.user.username}"
 
     def get_total_items(self):
-        return sum(item.quantity for item in self.items.all())
+        return self.total_items
 
 
 class CartItem(models.Model):
@@ -82,6 +151,116 @@ class CartItem(models.Model):
         unique_together = ('cart', 'product')
 
 
+class Order(models.Model):
+    """Checkout snapshot: prices, tax and totals are frozen when the order is placed"""
+    STATUS_PENDING = 'pending'
+    STATUS_PAID = 'paid'
+    STATUS_FAILED = 'failed'
+    STATUS_CANCELLED = 'cancelled'
+    STATUS_CHOICES = [
+        (STATUS_PENDING, 'Pending Payment'),
+        (STATUS_PAID, 'Paid'),
+        (STATUS_FAILED, 'Payment Failed'),
+        (STATUS_CANCELLED, 'Cancelled'),
+    ]
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='orders')
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default=STATUS_PENDING)
+
+    total_items = models.PositiveIntegerField(default=0)
+    subtotal = models.DecimalField(max_digits=12, decimal_places=2, help_text="Subtotal in INR")
+    tax = models.DecimalField(max_digits=12, decimal_places=2, help_text="GST in INR")
+    total = models.DecimalField(max_digits=12, decimal_places=2, help_text="Total in INR")
+    currency = models.CharField(max_length=3, default='INR')
+
+    # Cart.version the snapshot was taken from, and a digest of its contents
+    cart_version = models.PositiveIntegerField(default=0)
+    checkout_key = models.CharField(max_length=64, blank=True, db_index=True)
+
+    razorpay_order_id = models.CharField(max_length=100, unique=True, null=True, blank=True)
+    razorpay_payment_id = models.CharField(max_length=100, blank=True)
+
+    created_at = models.DateTimeField(auto_now_add=True)
+    paid_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['user', '-created_at'], name='order_user_created_idx'),
+            models.Index(fields=['user', 'status'], name='order_user_status_idx'),
+        ]
+
+    def __str__(self):
+        return f"Order #{self.pk} - {self.user.username} ({self.get_status_display()})"
+
+    @property
+    def amount_in_paise(self):
+        return int(self.total * 100)
+
+
+class OrderItem(models.Model):
+    """Order line with the product details and price as they were at checkout"""
+    order = models.ForeignKey(Order, related_name='items', on_delete=models.CASCADE)
+    product = models.ForeignKey(Product, on_delete=models.SET_NULL, null=True, blank=True)
+    product_name = models.CharField(max_length=100)
+    product_brand = models.CharField(max_length=100)
+    unit_price = models.DecimalField(max_digits=10, decimal_places=2)
+    quantity = models.PositiveIntegerField()
+    line_total = models.DecimalField(max_digits=12, decimal_places=2)
+
+    def __str__(self):
+        return f"{self.product_name} x {self.quantity}"
+
+
+class PaymentEvent(models.Model):
+    """Outbox of verified Razorpay webhook deliveries, drained by ``process_payment_events``"""
+    STATUS_PENDING = 'pending'
+    STATUS_PROCESSED = 'processed'
+    STATUS_IGNORED = 'ignored'
+    STATUS_DEAD = 'dead'
+    STATUS_CHOICES = [
+        (STATUS_PENDING, 'Pending'),
+        (STATUS_PROCESSED, 'Processed'),
+        (STATUS_IGNORED, 'Ignored'),
+        (STATUS_DEAD, 'Gave Up'),
+    ]
+
+    # Razorpay's X-Razorpay-Event-Id; redeliveries of the same event share it
+    event_id = models.CharField(max_length=100, unique=True)
+    event_type = models.CharField(max_length=50)
+    payload = models.JSONField()
+
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default=STATUS_PENDING)
+    attempts = models.PositiveIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True)
+
+    received_at = models.DateTimeField(auto_now_add=True)
+    processed_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['received_at']
+        indexes = [
+            models.Index(fields=['status', 'next_attempt_at'], name='paymentevent_due_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.event_type} ({self.event_id}) - {self.get_status_display()}"
+
+
+class AnalyticsSnapshot(models.Model):
+    """Admin dashboard metrics as of ``created_at``, written by ``refresh_analytics``"""
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+    data = models.JSONField(encoder=DjangoJSONEncoder)
+
+    class Meta:
+        ordering = ['-created_at']
+        get_latest_by = 'created_at'
+
+    def __str__(self):
+        return f"Analytics snapshot {self.created_at:%Y-%m-%d %H:%M}"
+
+
 class ProductReview(models.Model):
     """User reviews for products"""
     product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='reviews')
@@ -0,0 +1,111 @@
+"""Order pipeline.
+
+Checkout freezes the cart into an Order: each line's unit price, the tax and
+the totals are computed once and stored, and the lines are written with a
+single bulk insert. Payment handling then works purely from the Order, so
+nothing downstream re-reads live product prices or re-aggregates the cart.
+"""
+import hashlib
+from decimal import Decimal, ROUND_HALF_UP
+
+from django.db import transaction
+from django.utils import timezone
+
+from .cart import empty_cart, line_price
+from .models import Cart, Order, OrderItem
+
+
+TAX_RATE = Decimal('0.18')  # 18% GST
+CENT = Decimal('0.01')
+
+
+def _money(value):
+    return value.quantize(CENT, rounding=ROUND_HALF_UP)
+
+
+def checkout_key(cart, cart_items):
+    """Idempotency key for a checkout: the cart version plus what is in it, at what price"""
+    lines = sorted(f'{item.product_id}:{item.quantity}:{line_price(item.product)}' for item in cart_items)
+    raw = f'{cart.user_id}|{cart.version}|' + ','.join(lines)
+    return hashlib.sha256(raw.encode()).hexdigest()
+
+
+def get_checkout_order(cart):
+    """
+    The pending order for ``cart``'s current contents, created if needed.
+
+    Re-rendering checkout without touching the cart reuses the same order
+    (matched on ``checkout_key``); once the cart changes, older pending
+    orders are cancelled and a fresh snapshot is taken. Returns None for an
+    empty cart.
+    """
+    with transaction.atomic():
+        cart = Cart.objects.select_for_update().get(pk=cart.pk)
+        cart_items = list(cart.items.select_related('product'))
+        if not cart_items:
+            return None
+
+        key = checkout_key(cart, cart_items)
+        order = Order.objects.filter(user_id=cart.user_id, status=Order.STATUS_PENDING, checkout_key=key).first()
+        if order is not None:
+            return order
+
+        Order.objects.filter(user_id=cart.user_id, status=Order.STATUS_PENDING).update(status=Order.STATUS_CANCELLED)
+
+        lines = []
+        subtotal = Decimal('0')
+        total_items = 0
+        for item in cart_items:
+            unit_price = line_price(item.product)
+            line_total = _money(unit_price * item.quantity)
+            subtotal += line_total
+            total_items += item.quantity
+            lines.append(OrderItem(
+                product=item.product,
+                product_name=item.product.name,
+                product_brand=item.product.brand,
+                unit_price=unit_price,
+                quantity=item.quantity,
+                line_total=line_total,
+            ))
+
+        tax = _money(subtotal * TAX_RATE)
+        order = Order.objects.create(
+            user_id=cart.user_id,
+            total_items=total_items,
+            subtotal=subtotal,
+            tax=tax,
+            total=subtotal + tax,
+            cart_version=cart.version,
+            checkout_key=key,
+        )
+        for line in lines:
+            line.order = order
+        OrderItem.objects.bulk_create(lines)
+    return order
+
+
+def mark_order_paid(order, payment_id, from_statuses=(Order.STATUS_PENDING,)):
+    """
+    Record a successful payment and empty the buyer's cart.
+
+    Only an order in ``from_statuses`` (by default just pending ones)
+    transitions, so repeating the call (a refreshed redirect, a replayed
+    callback) is harmless. The cart is emptied only while the order is
+    still its current checkout; a late payment for a superseded order
+    leaves whatever the buyer has put in the cart since alone. Returns True
+    if this call marked the order paid.
+    """
+    with transaction.atomic():
+        updated = Order.objects.filter(pk=order.pk, status__in=from_statuses).update(
+            status=Order.STATUS_PAID,
+            razorpay_payment_id=payment_id,
+            paid_at=timezone.now(),
+        )
+        if updated:
+            cart = Cart.objects.select_for_update().filter(user_id=order.user_id).first()
+            if cart is not None and order.checkout_key:
+                cart_items = list(cart.items.select_related('product'))
+                if checkout_key(cart, cart_items) == order.checkout_key:
+                    empty_cart(cart)
+    return bool(updated)
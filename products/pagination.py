@@ -0,0 +1,190 @@
+"""Keyset (cursor) pagination for the product catalog.
+
+Offset pagination gets slower the deeper you page because the database still
+has to walk every skipped row. Keyset pagination instead remembers the sort
+value and id of the last row on the page and asks for rows *after* it, which
+the (sort key, id) indexes on Product answer with a bounded range scan.
+"""
+import base64
+import json
+from decimal import Decimal, InvalidOperation
+
+from django.db.models import F, Q
+
+
+PAGE_SIZE = 24
+
+# sort option -> (field, descending)
+SORT_OPTIONS = {
+    'newest': ('id', True),
+    'name': ('name', False),
+    'brand': ('brand', False),
+    'price_low': ('price', False),
+    'price_high': ('price', True),
+}
+DEFAULT_SORT = 'newest'
+
+# Fields that may be NULL; NULLs are always sorted last in either direction
+NULLABLE_FIELDS = {'price'}
+
+
+def _parse_int(value):
+    if isinstance(value, bool) or not isinstance(value, int):
+        raise TypeError(f'Expected an integer, got {value!r}')
+    return value
+
+
+def _parse_str(value):
+    if not isinstance(value, str):
+        raise TypeError(f'Expected a string, got {value!r}')
+    return value
+
+
+def _parse_decimal(value):
+    # encode_cursor writes Decimals as strings, so floats are not accepted either
+    value = Decimal(_parse_str(value))
+    if not value.is_finite():
+        raise ValueError(f'Expected a finite number, got {value!r}')
+    return value
+
+
+# sort field -> parser for the sort value held in its cursors
+CURSOR_PARSERS = {
+    'id': _parse_int,
+    'name': _parse_str,
+    'brand': _parse_str,
+    'price': _parse_decimal,
+}
+
+
+def encode_cursor(value, pk):
+    """Encode a (sort value, id) pair into an opaque URL-safe token"""
+    if isinstance(value, Decimal):
+        value = str(value)
+    raw = json.dumps([value, pk], separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(token, field):
+    """
+    Decode a cursor token, returning (value, id) or None if it is invalid.
+
+    The sort value must have the type ``field``'s cursors are written with,
+    and may only be null for a nullable field; a token that was tampered
+    with or made for another sort restarts from the first page instead of
+    reaching the database as a bad comparison.
+    """
+    if not token:
+        return None
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        decoded = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        if not isinstance(decoded, list):
+            return None
+        value, pk = decoded
+        pk = _parse_int(pk)
+        if value is None:
+            if field not in NULLABLE_FIELDS:
+                return None
+        else:
+            value = CURSOR_PARSERS[field](value)
+    except (ValueError, TypeError, InvalidOperation):
+        return None
+    return value, pk
+
+
+def _order_by(field, descending, reverse=False):
+    """Ordering for a page; ``reverse`` walks the same order backwards"""
+    if reverse:
+        descending = not descending
+    if field == 'id':
+        return ['-id'] if descending else ['id']
+    nulls = {}
+    if field in NULLABLE_FIELDS:
+        nulls = {'nulls_first': True} if reverse else {'nulls_last': True}
+    expression = F(field).desc(**nulls) if descending else F(field).asc(**nulls)
+    return [expression, '-id' if descending else 'id']
+
+
+def _seek(field, descending, value, pk):
+    """Build the filter selecting rows strictly after (value, pk) in sort order"""
+    pk_after = Q(id__lt=pk) if descending else Q(id__gt=pk)
+    if field == 'id':
+        return pk_after
+
+    if value is None:
+        # Already inside the trailing block of NULLs
+        return Q(**{f'{field}__isnull': True}) & pk_after
+
+    beyond = Q(**{f'{field}__lt' if descending else f'{field}__gt': value})
+    tie = Q(**{field: value}) & pk_after
+    condition = beyond | tie
+    if field in NULLABLE_FIELDS:
+        condition |= Q(**{f'{field}__isnull': True})
+    return condition
+
+
+def _seek_before(field, descending, value, pk):
+    """Build the filter selecting rows strictly before (value, pk) in sort order"""
+    pk_before = Q(id__gt=pk) if descending else Q(id__lt=pk)
+    if field == 'id':
+        return pk_before
+
+    if value is None:
+        return Q(**{f'{field}__isnull': False}) | (Q(**{f'{field}__isnull': True}) & pk_before)
+
+    ahead = Q(**{f'{field}__gt' if descending else f'{field}__lt': value})
+    tie = Q(**{field: value}) & pk_before
+    return ahead | tie
+
+
+def paginate_products(queryset, sort=DEFAULT_SORT, after=None, before=None, page_size=PAGE_SIZE):
+    """
+    Return one page of ``queryset`` ordered by ``sort``.
+
+    ``after`` / ``before`` are cursor tokens taken from a previous page's
+    ``next_cursor`` / ``prev_cursor``. Each page costs a single indexed query
+    of ``page_size + 1`` rows, no matter how far into the catalog it is.
+    """
+    if sort not in SORT_OPTIONS:
+        sort = DEFAULT_SORT
+    field, descending = SORT_OPTIONS[sort]
+
+    after_key = decode_cursor(after, field)
+    before_key = decode_cursor(before, field) if after_key is None else None
+
+    if before_key is not None:
+        # Walk backwards from the cursor, then flip the rows back into order
+        rows = list(
+            queryset.filter(_seek_before(field, descending, *before_key))
+            .order_by(*_order_by(field, descending, reverse=True))[:page_size + 1]
+        )
+        has_previous = len(rows) > page_size
+        rows = rows[:page_size]
+        rows.reverse()
+        has_next = True
+    else:
+        if after_key is not None:
+            queryset = queryset.filter(_seek(field, descending, *after_key))
+        rows = list(queryset.order_by(*_order_by(field, descending))[:page_size + 1])
+        has_next = len(rows) > page_size
+        rows = rows[:page_size]
+        has_previous = after_key is not None
+
+    next_cursor = prev_cursor = None
+    if rows:
+        if has_next:
+            last = rows[-1]
+            next_cursor = encode_cursor(getattr(last, field), last.id)
+        if has_previous:
+            first = rows[0]
+            prev_cursor = encode_cursor(getattr(first, field), first.id)
+
+    return {
+        'items': rows,
+        'sort': sort,
+        'next_cursor': next_cursor,
+        'prev_cursor': prev_cursor,
+        'has_next': next_cursor is not None,
+        'has_previous': prev_cursor is not None,
+    }
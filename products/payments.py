@@ -0,0 +1,176 @@
+"""Razorpay gateway access.
+
+One gateway object is shared by the whole process. It wraps a single
+``razorpay.Client`` whose ``requests`` session keeps a pool of HTTPS
+connections and applies connect/read timeouts to every call, so a slow
+gateway fails fast instead of pinning a worker.
+
+Signatures are checked locally with HMAC-SHA256 and never need a client.
+Set ``RAZORPAY_GATEWAY_CLASS`` to ``'products.payments.FakeGateway'`` to run
+checkout against an in-memory gateway (tests, offline development).
+"""
+import hashlib
+import hmac
+import itertools
+import threading
+
+import requests
+from django.conf import settings
+from django.db import transaction
+from django.utils.module_loading import import_string
+from requests.adapters import HTTPAdapter
+
+from .models import Order
+
+
+DEFAULT_CONNECT_TIMEOUT = 3.05
+DEFAULT_READ_TIMEOUT = 10
+DEFAULT_POOL_SIZE = 10
+
+_gateway = None
+_gateway_lock = threading.Lock()
+
+
+class GatewayError(Exception):
+    """The payment gateway could not be reached or rejected the request"""
+
+
+def keys_configured():
+    key_id = getattr(settings, 'RAZORPAY_KEY_ID', '')
+    key_secret = getattr(settings, 'RAZORPAY_KEY_SECRET', '')
+    return bool(key_id and key_secret) and 'your_key' not in key_id.lower() and 'your_key' not in key_secret.lower()
+
+
+class TimeoutSession(requests.Session):
+    """requests session that applies a default timeout to every request"""
+
+    def __init__(self, timeout, pool_size):
+        super().__init__()
+        self.timeout = timeout
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.mount('https://', adapter)
+
+    def request(self, method, url, **kwargs):
+        kwargs.setdefault('timeout', self.timeout)
+        return super().request(method, url, **kwargs)
+
+
+class RazorpayGateway:
+    def __init__(self, key_id, key_secret):
+        import razorpay
+
+        self.key_id = key_id
+        self.key_secret = key_secret
+        timeout = (
+            getattr(settings, 'RAZORPAY_CONNECT_TIMEOUT', DEFAULT_CONNECT_TIMEOUT),
+            getattr(settings, 'RAZORPAY_READ_TIMEOUT', DEFAULT_READ_TIMEOUT),
+        )
+        session = TimeoutSession(timeout, getattr(settings, 'RAZORPAY_POOL_SIZE', DEFAULT_POOL_SIZE))
+        self.client = razorpay.Client(session=session, auth=(key_id, key_secret))
+
+    def create_order(self, amount, currency, receipt):
+        try:
+            return self.client.order.create({
+                'amount': amount,
+                'currency': currency,
+                'receipt': receipt,
+                'payment_capture': '1',
+            })
+        except Exception as e:
+            raise GatewayError(str(e)) from e
+
+
+class FakeGateway:
+    """In-memory stand-in for Razorpay; records every order it is asked to create"""
+
+    def __init__(self, key_id='rzp_test_fake', key_secret='fake_secret'):
+        self.key_id = key_id
+        self.key_secret = key_secret
+        self.orders = []
+        self._ids = itertools.count(1)
+        self.fail_with = None
+
+    def create_order(self, amount, currency, receipt):
+        if self.fail_with is not None:
+            raise GatewayError(self.fail_with)
+        order = {
+            'id': f'order_fake{next(self._ids):06d}',
+            'amount': amount,
+            'currency': currency,
+            'receipt': receipt,
+            'status': 'created',
+        }
+        self.orders.append(order)
+        return order
+
+    def sign_payment(self, order_id, payment_id):
+        """The signature Razorpay Checkout would post back for this payment"""
+        return _hmac_hex(self.key_secret, f'{order_id}|{payment_id}')
+
+
+def get_gateway():
+    """The process-wide gateway, or None when no Razorpay keys are configured"""
+    global _gateway
+    if _gateway is None:
+        with _gateway_lock:
+            if _gateway is None:
+                gateway_class = getattr(settings, 'RAZORPAY_GATEWAY_CLASS', None)
+                if gateway_class:
+                    _gateway = import_string(gateway_class)()
+                elif keys_configured():
+                    _gateway = RazorpayGateway(settings.RAZORPAY_KEY_ID, settings.RAZORPAY_KEY_SECRET)
+    return _gateway
+
+
+def reset_gateway():
+    """Forget the shared gateway so the next call rebuilds it from settings"""
+    global _gateway
+    with _gateway_lock:
+        _gateway = None
+
+
+def _hmac_hex(secret, message):
+    return hmac.new(secret.encode(), message.encode(), hashlib.sha256).hexdigest()
+
+
+def verify_payment_signature(order_id, payment_id, signature, secret=None):
+    """Check Razorpay Checkout's ``razorpay_signature`` for an order/payment pair"""
+    if not (order_id and payment_id and signature):
+        return False
+    if secret is None:
+        gateway = get_gateway()
+        secret = gateway.key_secret if gateway is not None else settings.RAZORPAY_KEY_SECRET
+    expected = _hmac_hex(secret, f'{order_id}|{payment_id}')
+    return hmac.compare_digest(expected, signature)
+
+
+def verify_webhook_signature(body, signature, secret=None):
+    """Check the ``X-Razorpay-Signature`` header against the raw webhook body"""
+    secret = secret if secret is not None else getattr(settings, 'RAZORPAY_WEBHOOK_SECRET', '')
+    if not (secret and signature):
+        return False
+    expected = hmac.new(secret.encode(), body, hashlib.sha256).hexdigest()
+    return hmac.compare_digest(expected, signature)
+
+
+def ensure_gateway_order(order, gateway):
+    """
+    Razorpay order id for ``order``, creating the remote order at most once.
+
+    The order row is locked while the gateway is called, so concurrent
+    checkout renders wait for the first one rather than creating duplicates,
+    and the order's checkout key is sent as the Razorpay receipt.
+    """
+    if order.razorpay_order_id and not order.razorpay_order_id.startswith('demo_order_'):
+        return order.razorpay_order_id
+
+    with transaction.atomic():
+        locked = Order.objects.select_for_update().get(pk=order.pk)
+        if locked.razorpay_order_id and not locked.razorpay_order_id.startswith('demo_order_'):
+            order.razorpay_order_id = locked.razorpay_order_id
+            return order.razorpay_order_id
+
+        remote = gateway.create_order(order.amount_in_paise, order.currency, receipt=order.checkout_key[:40])
+        Order.objects.filter(pk=order.pk).update(razorpay_order_id=remote['id'])
+    order.razorpay_order_id = remote['id']
+    return order.razorpay_order_id
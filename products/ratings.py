@@ -0,0 +1,76 @@
+"""Product review aggregates.
+
+Each Product carries running sums and averages of its reviews' scores.
+They are shifted with one conditional UPDATE per review change (see the
+ProductReview signal receivers), so listing top rated products is an
+indexed ``ORDER BY avg_rating`` instead of an aggregate over every review.
+"""
+from django.db.models import Count, F, FloatField, IntegerField, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Cast, Coalesce, NullIf
+
+from .models import Product, ProductReview
+
+
+# review field -> (Product sum field, Product average field)
+RATING_FIELDS = {
+    'rating': ('rating_sum', 'avg_rating'),
+    'effectiveness': ('effectiveness_sum', 'avg_effectiveness'),
+    'value_for_money': ('value_for_money_sum', 'avg_value_for_money'),
+}
+AGGREGATE_FIELDS = ['rating_count'] + [name for fields in RATING_FIELDS.values() for name in fields]
+
+
+def review_scores(review):
+    return {field: getattr(review, field) for field in RATING_FIELDS}
+
+
+def _average(total, count):
+    return Coalesce(Cast(total, FloatField()) / NullIf(count, 0), Value(0.0))
+
+
+def adjust_product_ratings(product_id, count, scores):
+    """Shift a product's aggregates by ``count`` reviews totalling ``scores`` (either may be negative)"""
+    new_count = F('rating_count') + count
+    updates = {'rating_count': new_count}
+    for field, (sum_field, avg_field) in RATING_FIELDS.items():
+        new_sum = F(sum_field) + scores[field]
+        updates[sum_field] = new_sum
+        updates[avg_field] = _average(new_sum, new_count)
+    Product.objects.filter(pk=product_id).update(**updates)
+
+
+def review_added(review):
+    adjust_product_ratings(review.product_id, 1, review_scores(review))
+
+
+def review_removed(review):
+    adjust_product_ratings(review.product_id, -1, {field: -score for field, score in review_scores(review).items()})
+
+
+def review_changed(previous, review):
+    """Apply an edit, given ``previous`` as a dict of the old product_id and scores"""
+    scores = review_scores(review)
+    if previous['product_id'] != review.product_id:
+        adjust_product_ratings(previous['product_id'], -1, {field: -previous[field] for field in RATING_FIELDS})
+        adjust_product_ratings(review.product_id, 1, scores)
+        return
+    diff = {field: scores[field] - previous[field] for field in RATING_FIELDS}
+    if any(diff.values()):
+        adjust_product_ratings(review.product_id, 0, diff)
+
+
+def recalculate_product_ratings(queryset=None):
+    """Rebuild the aggregates from the reviews table in one UPDATE; returns the rows updated"""
+    if queryset is None:
+        queryset = Product.objects.all()
+    reviews = ProductReview.objects.filter(product=OuterRef('pk')).order_by().values('product')
+
+    def total(expression):
+        return Coalesce(Subquery(reviews.annotate(total=expression).values('total')), 0, output_field=IntegerField())
+
+    count = total(Count('id'))
+    updates = {'rating_count': count}
+    for field, (sum_field, avg_field) in RATING_FIELDS.items():
+        updates[sum_field] = total(Sum(field))
+        updates[avg_field] = _average(total(Sum(field)), count)
+    return queryset.update(**updates)
@@ -0,0 +1,94 @@
+"""Building shared routines from the share_routine form."""
+from django.core.exceptions import ValidationError
+from django.db import transaction
+
+from .models import Product, RoutineStep, UserRoutine
+
+
+MAX_STEPS = 20
+
+
+def _choice_values(field_name):
+    return {value for value, _ in UserRoutine._meta.get_field(field_name).choices}
+
+
+def _parse_steps(data, errors):
+    try:
+        step_count = int(data.get('step_count', 0))
+    except (TypeError, ValueError):
+        errors.append('Invalid number of steps.')
+        return []
+    if not 0 <= step_count <= MAX_STEPS:
+        errors.append(f'A routine can have at most {MAX_STEPS} steps.')
+        return []
+
+    steps = []
+    for i in range(1, step_count + 1):
+        name = (data.get(f'step_name_{i}') or '').strip()
+        instructions = (data.get(f'step_instructions_{i}') or '').strip()
+        product_id = (data.get(f'step_product_{i}') or '').strip()
+        if not (name or instructions):
+            # Removed or left blank in the form
+            continue
+        if not (name and instructions):
+            errors.append(f'Step {i} needs both a name and instructions.')
+            continue
+        if product_id and not product_id.isdigit():
+            errors.append(f'Step {i} has an invalid product.')
+            continue
+        steps.append({'name': name[:100], 'instructions': instructions, 'product_id': int(product_id) if product_id else None, 'field': i})
+    return steps
+
+
+def create_routine(user, data):
+    """
+    Validate the posted form and create the routine with its steps.
+
+    Everything is written in one transaction: one lookup for the referenced
+    products, one insert for the routine, one bulk insert for the steps and
+    one for the product links. Raises ValidationError listing every problem.
+    """
+    errors = []
+    title = (data.get('title') or '').strip()
+    description = (data.get('description') or '').strip()
+    skin_type = data.get('skin_type')
+    routine_type = data.get('routine_type')
+    if not title:
+        errors.append('Please give your routine a title.')
+    if not description:
+        errors.append('Please describe your routine.')
+    if skin_type not in _choice_values('skin_type'):
+        errors.append('Please choose a skin type.')
+    if routine_type not in _choice_values('routine_type'):
+        errors.append('Please choose when the routine is used.')
+
+    steps = _parse_steps(data, errors)
+    products = Product.objects.in_bulk({step['product_id'] for step in steps if step['product_id']})
+    for step in steps:
+        if step['product_id'] and step['product_id'] not in products:
+            errors.append(f"Step {step['field']} refers to a product that does not exist.")
+    if errors:
+        raise ValidationError(errors)
+
+    with transaction.atomic():
+        routine = UserRoutine.objects.create(
+            user=user,
+            title=title[:200],
+            description=description,
+            skin_type=skin_type,
+            routine_type=routine_type,
+            is_public=data.get('is_public') in ('on', 'true'),
+        )
+        RoutineStep.objects.bulk_create([
+            RoutineStep(
+                routine=routine,
+                step_number=number,
+                step_name=step['name'],
+                instructions=step['instructions'],
+                product=products.get(step['product_id']),
+            )
+            for number, step in enumerate(steps, 1)
+        ])
+        if products:
+            routine.products.add(*products.values())
+    return routine
@@ -0,0 +1,233 @@
+"""Ranked product search.
+
+On PostgreSQL each Product keeps a weighted ``search_vector`` (name and brand
+weigh most, then product type, then description) backed by a GIN index, and
+the ``pg_trgm`` extension catches misspelled words. On any other database the
+same ranking is served from ``ProductSearchToken``, a small inverted index of
+(token, product, weight) rows.
+
+Both indexes are refreshed from the Product ``post_save`` signal; run
+``python manage.py rebuild_search_index`` after bulk loads that bypass it.
+"""
+import re
+
+from django.db import connection, transaction
+from django.db.models import Case, F, IntegerField, Max, Q, Sum, Value, When
+
+from .models import Product, ProductSearchToken
+
+
+PAGE_SIZE = 24
+MAX_QUERY_TERMS = 8
+
+# field -> weight, mirroring PostgreSQL's A/B/C/D rank weights
+FIELD_WEIGHTS = {
+    'name': 1.0,
+    'brand': 1.0,
+    'product_type': 0.4,
+    'description': 0.1,
+}
+PG_WEIGHT_LABELS = {'name': 'A', 'brand': 'A', 'product_type': 'B', 'description': 'D'}
+
+SEARCH_CONFIG = 'english'
+
+TOKEN_RE = re.compile(r'[a-z0-9]+')
+
+
+def uses_postgres():
+    return connection.vendor == 'postgresql'
+
+
+def tokenize(text):
+    """Lower-case alphanumeric words of ``text``, in order"""
+    return TOKEN_RE.findall((text or '').lower())
+
+
+def _query_terms(query):
+    terms = []
+    for term in tokenize(query):
+        if term not in terms:
+            terms.append(term)
+    return terms[:MAX_QUERY_TERMS]
+
+
+def edit_distance(a, b, limit):
+    """Levenshtein distance between ``a`` and ``b``, or ``limit + 1`` once it is exceeded"""
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    previous = list(range(len(b) + 1))
+    for i, ca in enumerate(a, 1):
+        current = [i]
+        for j, cb in enumerate(b, 1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (ca != cb)))
+        if min(current) > limit:
+            return limit + 1
+        previous = current
+    return previous[-1]
+
+
+def _typo_limit(term):
+    if len(term) < 4:
+        return 0
+    return 1 if len(term) < 8 else 2
+
+
+# Index maintenance
+
+def _pg_search_vector():
+    from django.contrib.postgres.search import SearchVector
+
+    vector = None
+    for field, label in PG_WEIGHT_LABELS.items():
+        part = SearchVector(field, weight=label, config=SEARCH_CONFIG)
+        vector = part if vector is None else vector + part
+    return vector
+
+
+def _token_rows(product):
+    weights = {}
+    for field, weight in FIELD_WEIGHTS.items():
+        for token in tokenize(getattr(product, field)):
+            if len(token) > ProductSearchToken._meta.get_field('token').max_length:
+                continue
+            # A token found in several fields keeps its strongest weight
+            weights[token] = max(weights.get(token, 0), weight)
+    return [
+        ProductSearchToken(product_id=product.pk, token=token, weight=weight)
+        for token, weight in weights.items()
+    ]
+
+
+def index_product(product):
+    """Refresh the search index entry for a single product"""
+    if uses_postgres():
+        Product.objects.filter(pk=product.pk).update(search_vector=_pg_search_vector())
+        return
+
+    with transaction.atomic():
+        ProductSearchToken.objects.filter(product_id=product.pk).delete()
+        ProductSearchToken.objects.bulk_create(_token_rows(product))
+
+
+def rebuild_index(batch_size=1000):
+    """Rebuild the whole search index, returning the number of products indexed"""
+    if uses_postgres():
+        return Product.objects.update(search_vector=_pg_search_vector())
+
+    count = 0
+    with transaction.atomic():
+        ProductSearchToken.objects.all().delete()
+        rows = []
+        fields = ['id', *FIELD_WEIGHTS]
+        for product in Product.objects.only(*fields).iterator(chunk_size=batch_size):
+            rows.extend(_token_rows(product))
+            count += 1
+            if len(rows) >= batch_size:
+                ProductSearchToken.objects.bulk_create(rows)
+                rows = []
+        ProductSearchToken.objects.bulk_create(rows)
+    return count
+
+
+# Querying
+
+def _pg_search(queryset, terms, query):
+    from django.contrib.postgres.search import SearchQuery, SearchRank, TrigramWordSimilarity
+
+    # Every term must match, each as a prefix ("moist" finds "moisturizer")
+    tsquery = SearchQuery(
+        ' & '.join(f'{term}:*' for term in terms),
+        search_type='raw',
+        config=SEARCH_CONFIG,
+    )
+    typo_match = Q(name__trigram_word_similar=query) | Q(brand__trigram_word_similar=query)
+    return (
+        queryset.filter(Q(search_vector=tsquery) | typo_match)
+        .annotate(rank=SearchRank(F('search_vector'), tsquery) + TrigramWordSimilarity(query, 'name'))
+        .order_by('-rank', 'id')
+    )
+
+
+def _expand_term(term):
+    """Indexed tokens that ``term`` should match: prefixes first, near-misses as a fallback"""
+    tokens = ProductSearchToken.objects.filter(token__startswith=term).values_list('token', flat=True).distinct()
+    tokens = set(tokens)
+    if tokens:
+        return tokens
+
+    limit = _typo_limit(term)
+    if not limit:
+        return tokens
+    # Only tokens sharing the first letter are considered, which bounds the candidate set
+    candidates = ProductSearchToken.objects.filter(token__startswith=term[0]).values_list('token', flat=True).distinct()
+    return {token for token in candidates if edit_distance(term, token[:len(term) + limit], limit) <= limit}
+
+
+def _token_search(queryset, terms):
+    """Products matching every term, best score first, as a values() queryset of (product_id, score)"""
+    expanded = [_expand_term(term) for term in terms]
+    if not all(expanded):
+        return ProductSearchToken.objects.none().values('product_id')
+
+    matched_terms = sum(
+        (Max(Case(When(token__in=tokens, then=Value(1)), default=Value(0), output_field=IntegerField()))
+         for tokens in expanded),
+        Value(0),
+    )
+    return (
+        ProductSearchToken.objects.filter(token__in=set().union(*expanded), product__in=queryset.values('id'))
+        .values('product_id')
+        .annotate(score=Sum('weight'), matched=matched_terms)
+        .filter(matched=len(terms))
+        .order_by('-score', 'product_id')
+    )
+
+
+def filter_products(queryset, query):
+    """Narrow ``queryset`` to products matching ``query`` (used by the admin changelist)"""
+    terms = _query_terms(query)
+    if not terms:
+        return queryset
+    if uses_postgres():
+        return _pg_search(queryset, terms, query)
+    return queryset.filter(id__in=_token_search(queryset, terms).values('product_id'))
+
+
+def search_products(query, queryset=None, page=1, page_size=PAGE_SIZE):
+    """
+    Ranked, paginated product search.
+
+    Returns a dict with the page's ``items`` (each carrying a ``rank``), the
+    ``total`` number of matches and ``has_next`` / ``has_previous`` flags.
+    """
+    if queryset is None:
+        queryset = Product.objects.all()
+    terms = _query_terms(query)
+    page = max(1, page)
+    offset = (page - 1) * page_size
+
+    if not terms:
+        items, total = [], 0
+    elif uses_postgres():
+        results = _pg_search(queryset, terms, query)
+        total = results.count()
+        items = list(results[offset:offset + page_size])
+    else:
+        hits = _token_search(queryset, terms)
+        total = hits.count()
+        scores = {row['product_id']: row['score'] for row in hits[offset:offset + page_size]}
+        products = queryset.in_bulk(list(scores))
+        items = []
+        for product_id, score in scores.items():
+            product = products[product_id]
+            product.rank = score
+            items.append(product)
+
+    return {
+        'items': items,
+        'query': query,
+        'total': total,
+        'page': page,
+        'has_previous': page > 1,
+        'has_next': offset + page_size < total,
+    }
@@ -0,0 +1,96 @@
+from django.contrib.auth.models import User
+from django.contrib.auth.signals import user_logged_in
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from . import site_counts
+from .cart import merge_guest_items
+from .categories import classify
+from .guest_cart import GuestCart
+from .community import invalidate as invalidate_community
+from .models import Product, ProductReview, ReviewHelpful, RoutineLike, UserRoutine
+from .ratings import RATING_FIELDS, review_added, review_changed, review_removed
+from .search import index_product
+
+
+@receiver(pre_save, sender=Product)
+def classify_product(sender, instance, raw=False, **kwargs):
+    """Derive the normalised category from the free-text product type"""
+    if raw:
+        return
+    instance.category = classify(instance.product_type, instance.name)
+
+
+@receiver(post_save, sender=Product)
+def refresh_product_search_index(sender, instance, raw=False, **kwargs):
+    """Keep the product search index in step with every save"""
+    if raw:
+        return
+    index_product(instance)
+
+
+@receiver(user_logged_in)
+def merge_guest_cart_on_login(sender, request, user, **kwargs):
+    """Move anything a shopper added before signing in into their Cart"""
+    if request is None:
+        return
+    guest_cart = getattr(request, 'guest_cart', None) or GuestCart(request)
+    if guest_cart.quantities:
+        merge_guest_items(user, guest_cart.quantities)
+        guest_cart.empty()
+
+
+@receiver(pre_save, sender=ProductReview)
+def remember_previous_review_scores(sender, instance, raw=False, **kwargs):
+    """Capture the scores being replaced so the product aggregates can be shifted by the difference"""
+    instance._previous_scores = None
+    if raw or instance.pk is None:
+        return
+    instance._previous_scores = (
+        ProductReview.objects.filter(pk=instance.pk).values('product_id', *RATING_FIELDS).first()
+    )
+
+
+@receiver(post_save, sender=ProductReview)
+def update_product_ratings_on_save(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    previous = getattr(instance, '_previous_scores', None)
+    if created or previous is None:
+        review_added(instance)
+    else:
+        review_changed(previous, instance)
+    instance._previous_scores = None
+
+
+@receiver(post_delete, sender=ProductReview)
+def update_product_ratings_on_delete(sender, instance, **kwargs):
+    review_removed(instance)
+
+
+@receiver([post_save, post_delete], sender=ProductReview)
+@receiver([post_save, post_delete], sender=ReviewHelpful)
+def invalidate_community_reviews(sender, **kwargs):
+    invalidate_community('reviews')
+
+
+@receiver([post_save, post_delete], sender=UserRoutine)
+@receiver([post_save, post_delete], sender=RoutineLike)
+def invalidate_community_routines(sender, update_fields=None, **kwargs):
+    # A view count bump alone is not worth throwing the cached sections away
+    if update_fields is not None and set(update_fields) == {'views_count'}:
+        return
+    invalidate_community('routines')
+
+
+@receiver(post_save, sender=User)
+@receiver(post_save, sender=Product)
+def count_created_row(sender, created, raw=False, **kwargs):
+    if created and not raw:
+        site_counts.adjust_for_model(sender, 1)
+
+
+@receiver(post_delete, sender=User)
+@receiver(post_delete, sender=Product)
+def count_deleted_row(sender, **kwargs):
+    site_counts.adjust_for_model(sender, -1)
@@ -0,0 +1,94 @@
+"""Site-wide row counts for the user dashboard.
+
+Counting every row of a large Postgres table is a sequential scan, so the
+totals live in the cache. Saves and deletes shift them with ``cache.incr``
+once the transaction commits (see the receivers in ``products.signals`` and
+``quiz.signals``; quiz answers are adjusted by ``quiz.answers`` because they
+are bulk inserted, and counted before a user or option deletion cascades to
+them). ``reconcile_counters`` recounts them periodically, and a
+missing or expired count is recounted on the next read.
+
+Tables listed in ``SITE_COUNTS_ESTIMATED`` are not counted exactly on
+PostgreSQL once they hold more than ``SITE_COUNTS_ESTIMATE_THRESHOLD`` rows;
+the planner's ``pg_class.reltuples`` estimate is used instead.
+"""
+from django.apps import apps
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection, transaction
+
+
+# Dashboard name -> counted model
+COUNTED_MODELS = {
+    'users': 'auth.User',
+    'products': 'products.Product',
+    'questions': 'quiz.Question',
+    'options': 'quiz.Option',
+    'answers': 'quiz.UserAnswer',
+}
+_NAMES_BY_LABEL = {label: name for name, label in COUNTED_MODELS.items()}
+
+
+def _key(name):
+    return f'site_counts:{name}'
+
+
+def _timeout():
+    return getattr(settings, 'SITE_COUNTS_TIMEOUT', 60 * 60)
+
+
+def _estimate(model):
+    """Planner row estimate for ``model``'s table, or None if it has never been analysed"""
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass', [model._meta.db_table])
+        row = cursor.fetchone()
+    return row[0] if row and row[0] >= 0 else None
+
+
+def count(name):
+    """Count the rows behind ``name``, from the planner estimate where that's allowed"""
+    model = apps.get_model(COUNTED_MODELS[name])
+    if connection.vendor == 'postgresql' and name in getattr(settings, 'SITE_COUNTS_ESTIMATED', ()):
+        estimate = _estimate(model)
+        if estimate is not None and estimate > getattr(settings, 'SITE_COUNTS_ESTIMATE_THRESHOLD', 100000):
+            return estimate
+    return model.objects.count()
+
+
+def get_counts():
+    """``{name: count}`` for every counted model, recounting only those missing from the cache"""
+    cached = cache.get_many([_key(name) for name in COUNTED_MODELS])
+    counts = {}
+    for name in COUNTED_MODELS:
+        value = cached.get(_key(name))
+        if value is None:
+            value = count(name)
+            cache.set(_key(name), value, _timeout())
+        counts[name] = value
+    return counts
+
+
+def adjust(name, delta):
+    """Shift a count by ``delta`` once the surrounding transaction commits"""
+    if not delta:
+        return
+
+    def apply():
+        try:
+            cache.incr(_key(name), delta)
+        except ValueError:
+            # Not cached; the next read recounts
+            pass
+
+    transaction.on_commit(apply)
+
+
+def adjust_for_model(model, delta):
+    adjust(_NAMES_BY_LABEL[model._meta.label], delta)
+
+
+def reconcile():
+    """Recount everything and store the results; returns the counts"""
+    counts = {name: count(name) for name in COUNTED_MODELS}
+    cache.set_many({_key(name): value for name, value in counts.items()}, _timeout())
+    return counts
@@ -1,3 +1,691 @@
-from django.test import TestCase
+import hashlib
+import hmac
+import json
+from decimal import Decimal
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.db import OperationalError, connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from quiz.models import SkinProfile
+
+from . import analytics, cart, orders, pagination, payments, ratings, routines, search, site_counts, view_counts, webhooks
+from .models import (
+    AnalyticsSnapshot, Cart, CartItem, Order, PaymentEvent, Product, ProductReview, RoutineStep, UserRoutine,
+)
+
+
+class CartServiceTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('shopper', password='pw')
+        self.cart = cart.get_cart(self.user)
+        self.product = Product.objects.create(
+            name='Niacinamide Serum', brand='Acme', product_type='Serum',
+            skin_type='oily', description='x', price=Decimal('100.00'),
+        )
+
+    def assertCart(self, quantity, total_items, subtotal):
+        self.assertEqual(cart._item_quantity(self.cart, self.product), quantity)
+        self.cart.refresh_from_db()
+        self.assertEqual((self.cart.total_items, self.cart.subtotal), (total_items, Decimal(subtotal)))
+
+    def test_remove_units_decides_on_the_locked_quantity(self):
+        cart.add_item(self.cart, self.product, 1)
+        select_for_update = CartItem.objects.select_for_update
+
+        def add_first(*args, **kwargs):
+            # Another request adds two units just before the row is locked
+            cart.add_item(self.cart, self.product, 2)
+            return select_for_update(*args, **kwargs)
+
+        with mock.patch.object(CartItem.objects, 'select_for_update', add_first):
+            self.assertEqual(cart.remove_units(self.cart, self.product, 1), 2)
+        self.assertCart(2, 2, '200.00')
+
+        self.assertEqual(cart.remove_units(self.cart, self.product, 5), 0)
+        self.assertCart(0, 0, '0.00')
+
+    def test_subtotal_follows_price_changes(self):
+        cart.add_item(self.cart, self.product, 2)
+        self.product.price = Decimal('150.00')
+        self.product.save()
+
+        cart.remove_units(self.cart, self.product, 1)
+        self.assertCart(1, 1, '150.00')
+        cart.remove_item(self.cart, self.product)
+        self.assertCart(0, 0, '0.00')
+
+
+    def test_quantities_are_capped(self):
+        for _ in range(3):
+            cart.add_item(self.cart, self.product, cart.MAX_QUANTITY)
+        self.assertCart(99, 99, '9900.00')
+
+        self.assertEqual(cart.set_quantity(self.cart, self.product, 150), 99)
+        cart.bulk_set_quantities(self.cart, {self.product: 500})
+        self.assertCart(99, 99, '9900.00')
+
+
+class CartApiTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('api', password='pw')
+        self.product = Product.objects.create(
+            name='Lip Balm', brand='Acme', product_type='Balm',
+            skin_type='dry', description='x', price=Decimal('50.00'),
+        )
+
+    def post(self, name, data):
+        return self.client.post(reverse(name), json.dumps(data), content_type='application/json')
+
+    def check_endpoints(self):
+        for _ in range(3):
+            response = self.post('api_cart_add', {'product_id': self.product.id, 'quantity': 99})
+        self.assertEqual(response.json()['item'], {'product_id': self.product.id, 'quantity': 99})
+        self.assertEqual(response.json()['cart'], {'total_items': 99, 'subtotal': '4950.00'})
+
+        response = self.post('api_cart_update', {'product_id': self.product.id, 'delta': -90})
+        self.assertEqual(response.json()['item']['quantity'], 9)
+        response = self.post('api_cart_bulk_set', {'items': {str(self.product.id): 4}})
+        self.assertEqual(response.json()['cart']['total_items'], 4)
+
+        self.assertEqual(self.post('api_cart_add', {'product_id': self.product.id, 'quantity': 100}).status_code, 400)
+        self.assertEqual(self.post('api_cart_bulk_set', {'items': {str(self.product.id): 100}}).status_code, 400)
+        self.assertEqual(self.post('api_cart_add', {'product_id': 999999}).status_code, 404)
+
+        response = self.post('api_cart_remove', {'product_id': self.product.id})
+        self.assertEqual(response.json()['cart']['total_items'], 0)
+
+    def test_signed_in_cart(self):
+        self.client.login(username='api', password='pw')
+        self.check_endpoints()
+        self.assertFalse(CartItem.objects.exists())
+
+    def test_guest_cart_behaves_the_same(self):
+        self.check_endpoints()
+        self.assertFalse(Cart.objects.exists())
+
+
+class OrderSnapshotTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('orderer', password='pw')
+        self.cart = cart.get_cart(self.user)
+        self.product = Product.objects.create(
+            name='Ceramide Cream', brand='Acme', product_type='Cream',
+            skin_type='dry', description='x', price=Decimal('200.00'),
+        )
+        cart.add_item(self.cart, self.product, 2)
+
+    def checkout(self):
+        self.cart.refresh_from_db()
+        return orders.get_checkout_order(self.cart)
+
+    def test_unchanged_cart_reuses_its_order(self):
+        order = self.checkout()
+        self.assertEqual((order.subtotal, order.tax, order.total), (Decimal('400.00'), Decimal('72.00'), Decimal('472.00')))
+        line = order.items.get()
+        self.assertEqual((line.product_name, line.unit_price, line.quantity), ('Ceramide Cream', Decimal('200.00'), 2))
+
+        self.assertEqual(self.checkout().pk, order.pk)
+        self.assertEqual(Order.objects.count(), 1)
+
+    def test_cart_or_price_change_takes_a_new_snapshot(self):
+        first = self.checkout()
+        cart.add_item(self.cart, self.product, 1)
+        second = self.checkout()
+        self.assertNotEqual(second.pk, first.pk)
+        self.assertEqual(second.total_items, 3)
+
+        self.product.price = Decimal('250.00')
+        self.product.save()
+        third = self.checkout()
+        self.assertNotEqual(third.pk, second.pk)
+        self.assertEqual(third.subtotal, Decimal('750.00'))
+
+        statuses = dict(Order.objects.values_list('pk', 'status'))
+        self.assertEqual(
+            [statuses[first.pk], statuses[second.pk], statuses[third.pk]],
+            [Order.STATUS_CANCELLED, Order.STATUS_CANCELLED, Order.STATUS_PENDING],
+        )
+        # The cancelled snapshot keeps the price it was taken at
+        self.assertEqual(second.items.get().unit_price, Decimal('200.00'))
+
+
+class ProductRatingTests(TestCase):
+    def setUp(self):
+        self.product = Product.objects.create(name='Sheet Mask', brand='Acme', product_type='Mask', skin_type='dry', description='x')
+        self.other = Product.objects.create(name='Clay Mask', brand='Acme', product_type='Mask', skin_type='oily', description='x')
+
+    def review(self, username, rating, effectiveness=3):
+        return ProductReview.objects.create(
+            product=self.product, user=User.objects.create_user(username), rating=rating, title='t',
+            review_text='x', skin_type='dry', effectiveness=effectiveness, usage_duration='1 month',
+        )
+
+    def ratings(self, product):
+        product.refresh_from_db()
+        return product.rating_count, product.rating_sum, product.avg_rating, product.avg_effectiveness
+
+    def test_aggregates_follow_review_changes(self):
+        first = self.review('first', 5, effectiveness=4)
+        second = self.review('second', 2)
+        self.assertEqual(self.ratings(self.product), (2, 7, 3.5, 3.5))
+
+        second.rating = 4
+        second.save()
+        self.assertEqual(self.ratings(self.product), (2, 9, 4.5, 3.5))
+
+        first.product = self.other
+        first.save()
+        self.assertEqual(self.ratings(self.product), (1, 4, 4.0, 3.0))
+        self.assertEqual(self.ratings(self.other), (1, 5, 5.0, 4.0))
+
+        second.delete()
+        self.assertEqual(self.ratings(self.product), (0, 0, 0.0, 0.0))
+
+        # The running values match a full rebuild from the reviews table
+        expected = [self.ratings(self.product), self.ratings(self.other)]
+        ratings.recalculate_product_ratings()
+        self.assertEqual([self.ratings(self.product), self.ratings(self.other)], expected)
+
+
+class GuestCartTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('guest', password='pw')
+        self.product = Product.objects.create(
+            name='Vitamin C Serum', brand='Acme', product_type='Serum',
+            skin_type='normal', description='x', price=Decimal('300.00'),
+        )
+
+    def log_in(self):
+        return self.client.post(reverse('login'), {'username': 'guest', 'password': 'pw'})
+
+    def test_guest_cart_merges_on_login(self):
+        cart.add_item(cart.get_cart(self.user), self.product, 1)
+        self.client.get(reverse('add_to_cart', args=[self.product.id]))
+        self.client.get(reverse('add_to_cart', args=[self.product.id]))
+        # Guest adds only touch the cookie
+        self.assertEqual(CartItem.objects.get().quantity, 1)
+
+        self.log_in()
+        user_cart = Cart.objects.get(user=self.user)
+        self.assertEqual(user_cart.items.get().quantity, 3)
+        self.assertEqual((user_cart.total_items, user_cart.subtotal), (3, Decimal('900.00')))
+        self.assertEqual(self.client.cookies['guest_cart'].value, '')
+
+    def test_tampered_cookie_is_ignored(self):
+        self.client.get(reverse('add_to_cart', args=[self.product.id]))
+        signed = self.client.cookies['guest_cart'].value
+        self.client.cookies['guest_cart'] = signed.replace('{"%d":1}' % self.product.id, '{"%d":99}' % self.product.id)
+        self.assertNotEqual(self.client.cookies['guest_cart'].value, signed)
+
+        response = self.client.get(reverse('view_cart'))
+        self.assertEqual(list(response.context['cart_items']), [])
+        self.log_in()
+        self.assertFalse(CartItem.objects.exists())
+
+
+class ProductCatalogTests(TestCase):
+    def setUp(self):
+        for name, brand, skin_type, price in [
+            ('Hydrating Cleanser', 'CeraVe', 'dry', '499.00'),
+            ('Oil Control Gel', 'Neutrogena', 'oily', '350.00'),
+            ('Calming Toner', 'Hydra Labs', 'sensitive', '650.00'),
+            ('Night Cream', 'Acme', 'dry', None),
+        ]:
+            Product.objects.create(
+                name=name, brand=brand, skin_type=skin_type, product_type=name.split()[-1],
+                description=f'{name} by {brand}', price=price and Decimal(price),
+            )
+
+    def test_autocomplete_matches_name_or_brand_prefix(self):
+        response = self.client.get(reverse('api_product_autocomplete'), {'q': 'hYdRa'})
+        self.assertEqual([row['name'] for row in response.json()['results']], ['Calming Toner', 'Hydrating Cleanser'])
+
+        response = self.client.get(reverse('api_product_autocomplete'), {'q': 'hydra', 'skin_type': 'dry'})
+        self.assertEqual([row['name'] for row in response.json()['results']], ['Hydrating Cleanser'])
+
+        response = self.client.get(reverse('api_product_autocomplete'), {'q': 'cleanser'})
+        self.assertEqual(response.json()['results'], [])
+
+    def test_search_ranks_name_matches_above_description_matches(self):
+        Product.objects.create(name='Aloe Mist', brand='Acme', product_type='Mist', description='A light gel mist')
+        response = self.client.get(reverse('product_list'), {'q': 'gel'})
+        self.assertEqual([product.name for product in response.context['products']], ['Oil Control Gel', 'Aloe Mist'])
+        self.assertEqual(response.context['page']['total'], 2)
+
+        self.assertEqual(search.search_products('night gel')['total'], 0)
+
+    def test_token_index_fallback(self):
+        # The index other databases use, built and queried even when running on PostgreSQL
+        with mock.patch('products.search.uses_postgres', return_value=False):
+            self.assertEqual(search.rebuild_index(), 4)
+            by_prefix = search.search_products('hydra')
+            by_typo = search.search_products('clenser')
+            narrowed = search.filter_products(Product.objects.filter(skin_type='dry'), 'hydra')
+
+        self.assertEqual([product.name for product in by_prefix['items']], ['Hydrating Cleanser', 'Calming Toner'])
+        self.assertEqual([product.name for product in by_typo['items']], ['Hydrating Cleanser'])
+        self.assertEqual([product.name for product in narrowed], ['Hydrating Cleanser'])
+
+    def test_cursor_round_trip(self):
+        for field, value in [('id', 7), ('name', 'Night Cream'), ('price', Decimal('499.00')), ('price', None)]:
+            token = pagination.encode_cursor(value, 7)
+            self.assertEqual(pagination.decode_cursor(token, field), (value, 7))
+
+        names = []
+        after = None
+        while True:
+            page = pagination.paginate_products(Product.objects.all(), sort='price_low', after=after, page_size=3)
+            names += [product.name for product in page['items']]
+            if not page['has_next']:
+                break
+            after = page['next_cursor']
+        self.assertEqual(names, ['Oil Control Gel', 'Hydrating Cleanser', 'Calming Toner', 'Night Cream'])
+
+    def test_page_links_keep_an_encoded_skin_type(self):
+        Product.objects.bulk_create(
+            Product(name=f'Balm {i:02}', brand='Acme', skin_type='dry & oily', product_type='Balm')
+            for i in range(pagination.PAGE_SIZE + 1)
+        )
+        response = self.client.get(reverse('product_list'), {'skin_type': 'dry & oily', 'sort': 'name'})
+        next_link = f"?skin_type=dry%20%26%20oily&sort=name&after={response.context['page']['next_cursor']}"
+        self.assertContains(response, f'href="{next_link}"')
+
+        response = self.client.get(reverse('product_list') + next_link)
+        self.assertEqual([product.name for product in response.context['products']], ['Balm 24'])
+
+    def test_malformed_cursor_restarts_from_first_page(self):
+        for field, token in [
+            ('price', pagination.encode_cursor('cheap', 1)),
+            ('price', pagination.encode_cursor('NaN', 1)),
+            ('price', pagination.encode_cursor(499.5, 1)),
+            ('name', pagination.encode_cursor(12, 1)),
+            ('name', pagination.encode_cursor(None, 1)),
+            ('id', pagination.encode_cursor('7', 1)),
+            ('id', pagination.encode_cursor(7, True)),
+            ('name', 'bm90IGpzb24'),
+            ('name', '!!!'),
+        ]:
+            self.assertIsNone(pagination.decode_cursor(token, field), token)
+
+        response = self.client.get(reverse('product_list'), {'sort': 'price_low', 'after': pagination.encode_cursor('cheap', 1)})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['products'][0].name, 'Oil Control Gel')
+
+
+@override_settings(RAZORPAY_GATEWAY_CLASS='products.payments.FakeGateway')
+class CheckoutPaymentTests(TestCase):
+    def setUp(self):
+        payments.reset_gateway()
+        self.addCleanup(payments.reset_gateway)
+        self.user = User.objects.create_user('buyer', password='secret')
+        self.product = Product.objects.create(
+            name='Hydrating Cleanser', brand='CeraVe', product_type='Cleanser',
+            skin_type='dry', description='Gentle cleanser', price='499.00',
+        )
+        self.client.login(username='buyer', password='secret')
+        self.client.get(reverse('add_to_cart', args=[self.product.id]))
+
+    def test_repeat_checkout_reuses_gateway_order(self):
+        self.client.get(reverse('checkout'))
+        self.client.get(reverse('checkout'))
+
+        gateway = payments.get_gateway()
+        self.assertEqual(len(gateway.orders), 1)
+        self.assertEqual(gateway.orders[0]['amount'], 58882)
+        self.assertEqual(Order.objects.filter(status=Order.STATUS_PENDING).count(), 1)
+
+    def test_cart_change_creates_new_order(self):
+        self.client.get(reverse('checkout'))
+        self.client.get(reverse('add_to_cart', args=[self.product.id]))
+        self.client.get(reverse('checkout'))
+
+        self.assertEqual(len(payments.get_gateway().orders), 2)
+        self.assertEqual(Order.objects.get(status=Order.STATUS_PENDING).total_items, 2)
+        self.assertEqual(Order.objects.filter(status=Order.STATUS_CANCELLED).count(), 1)
+
+    def test_signed_payment_marks_order_paid(self):
+        self.client.get(reverse('checkout'))
+        order = Order.objects.get()
+        signature = payments.get_gateway().sign_payment(order.razorpay_order_id, 'pay_123')
+
+        response = self.client.post(reverse('process_payment'), {
+            'razorpay_order_id': order.razorpay_order_id,
+            'razorpay_payment_id': 'pay_123',
+            'razorpay_signature': signature,
+        })
+
+        self.assertRedirects(response, reverse('payment_success', args=[order.pk]))
+        order.refresh_from_db()
+        self.assertEqual(order.status, Order.STATUS_PAID)
+        self.assertFalse(CartItem.objects.exists())
+        self.assertEqual(Cart.objects.get().total_items, 0)
+
+    def test_bad_signature_is_rejected(self):
+        self.client.get(reverse('checkout'))
+        order = Order.objects.get()
+
+        response = self.client.post(reverse('process_payment'), {
+            'razorpay_order_id': order.razorpay_order_id,
+            'razorpay_payment_id': 'demo_pay_1',
+            'razorpay_signature': 'not-a-signature',
+        })
+
+        self.assertRedirects(response, reverse('checkout'), fetch_redirect_response=False)
+        order.refresh_from_db()
+        self.assertEqual(order.status, Order.STATUS_FAILED)
+        self.assertTrue(CartItem.objects.exists())
+
+    def test_gateway_failure_never_opens_an_unsigned_order(self):
+        payments.get_gateway().fail_with = 'Gateway timed out'
+        response = self.client.get(reverse('checkout'))
+        self.assertRedirects(response, reverse('view_cart'), fetch_redirect_response=False)
+        order = Order.objects.get()
+        self.assertIsNone(order.razorpay_order_id)
+
+        # Nor is a demo order id accepted without a signature while a gateway is configured
+        Order.objects.filter(pk=order.pk).update(razorpay_order_id=f'demo_order_{order.pk}')
+        self.client.post(reverse('process_payment'), {
+            'razorpay_order_id': f'demo_order_{order.pk}',
+            'razorpay_payment_id': 'pay_free',
+        })
+        order.refresh_from_db()
+        self.assertNotEqual(order.status, Order.STATUS_PAID)
+
+
+@override_settings(RAZORPAY_GATEWAY_CLASS='products.payments.FakeGateway', RAZORPAY_WEBHOOK_SECRET='whsec')
+class PaymentWebhookTests(TestCase):
+    def setUp(self):
+        payments.reset_gateway()
+        self.addCleanup(payments.reset_gateway)
+        User.objects.create_user('buyer', password='secret')
+        product = Product.objects.create(
+            name='Hydrating Cleanser', brand='CeraVe', product_type='Cleanser',
+            skin_type='dry', description='Gentle cleanser', price='499.00',
+        )
+        self.client.login(username='buyer', password='secret')
+        self.client.get(reverse('add_to_cart', args=[product.id]))
+        self.client.get(reverse('checkout'))
+        self.client.logout()
+        self.order = Order.objects.get()
+
+    def deliver(self, event_id, amount=None, signature=None):
+        body = json.dumps({
+            'event': 'payment.captured',
+            'payload': {'payment': {'entity': {
+                'id': 'pay_hook1',
+                'order_id': self.order.razorpay_order_id,
+                'amount': self.order.amount_in_paise if amount is None else amount,
+                'currency': 'INR',
+            }}},
+        }).encode()
+        if signature is None:
+            signature = hmac.new(b'whsec', body, hashlib.sha256).hexdigest()
+        return self.client.post(
+            reverse('razorpay_webhook'), body, content_type='application/json',
+            HTTP_X_RAZORPAY_SIGNATURE=signature, HTTP_X_RAZORPAY_EVENT_ID=event_id,
+        )
+
+    def test_webhook_only_queues_event(self):
+        self.assertEqual(self.deliver('evt_1').status_code, 200)
+        self.assertEqual(self.deliver('evt_1').status_code, 200)
+
+        self.assertEqual(PaymentEvent.objects.count(), 1)
+        self.order.refresh_from_db()
+        self.assertEqual(self.order.status, Order.STATUS_PENDING)
+
+    def test_bad_signature_is_rejected(self):
+        self.assertEqual(self.deliver('evt_1', signature='forged').status_code, 400)
+        self.assertFalse(PaymentEvent.objects.exists())
+
+    def test_worker_marks_order_paid_once(self):
+        self.deliver('evt_1')
+        self.deliver('evt_2')
+
+        self.assertEqual(webhooks.process_due_events(), {PaymentEvent.STATUS_PROCESSED: 2})
+        self.order.refresh_from_db()
+        self.assertEqual(self.order.status, Order.STATUS_PAID)
+        self.assertEqual(self.order.razorpay_payment_id, 'pay_hook1')
+        self.assertFalse(CartItem.objects.exists())
+        self.assertEqual(webhooks.process_due_events(), {})
+
+    def test_amount_mismatch_is_not_retried(self):
+        self.deliver('evt_1', amount=100)
+
+        self.assertEqual(webhooks.process_due_events(), {PaymentEvent.STATUS_DEAD: 1})
+        self.order.refresh_from_db()
+        self.assertEqual(self.order.status, Order.STATUS_PENDING)
+
+    def test_capture_pays_a_failed_order(self):
+        Order.objects.filter(pk=self.order.pk).update(status=Order.STATUS_FAILED)
+        self.deliver('evt_1')
+
+        self.assertEqual(webhooks.process_due_events(), {PaymentEvent.STATUS_PROCESSED: 1})
+        self.order.refresh_from_db()
+        self.assertEqual(self.order.status, Order.STATUS_PAID)
+
+    def test_late_capture_leaves_a_newer_checkout_alone(self):
+        Order.objects.filter(pk=self.order.pk).update(status=Order.STATUS_FAILED)
+        self.client.login(username='buyer', password='secret')
+        self.client.get(reverse('add_to_cart', args=[Product.objects.get().id]))
+        self.client.get(reverse('checkout'))
+        newer = Order.objects.get(status=Order.STATUS_PENDING)
+        self.deliver('evt_1')
+
+        self.assertEqual(webhooks.process_due_events(), {PaymentEvent.STATUS_PROCESSED: 1})
+        self.order.refresh_from_db()
+        self.assertEqual(self.order.status, Order.STATUS_PAID)
+        self.assertEqual(CartItem.objects.get().quantity, 2)
+        newer.refresh_from_db()
+        self.assertEqual(newer.status, Order.STATUS_PENDING)
+
+    def test_capture_for_cancelled_order_is_flagged(self):
+        Order.objects.filter(pk=self.order.pk).update(status=Order.STATUS_CANCELLED)
+        self.deliver('evt_1')
+
+        with self.assertLogs('products.webhooks', 'ERROR'):
+            self.assertEqual(webhooks.process_due_events(), {PaymentEvent.STATUS_DEAD: 1})
+        self.assertIn('cancelled order', PaymentEvent.objects.get().last_error)
+        self.order.refresh_from_db()
+        self.assertEqual(self.order.status, Order.STATUS_CANCELLED)
+
+    def test_failures_back_off(self):
+        self.deliver('evt_1')
+        now = timezone.now()
+
+        with mock.patch('products.webhooks.mark_order_paid', side_effect=OperationalError('db busy')):
+            self.assertEqual(webhooks.process_due_events(now=now), {PaymentEvent.STATUS_PENDING: 1})
+        event = PaymentEvent.objects.get()
+        self.assertEqual(event.attempts, 1)
+        self.assertEqual(event.next_attempt_at, now + webhooks.retry_delay(1))
+        self.assertEqual(webhooks.process_due_events(now=now), {})
+
+        self.assertEqual(webhooks.process_due_events(now=event.next_attempt_at), {PaymentEvent.STATUS_PROCESSED: 1})
+        self.order.refresh_from_db()
+        self.assertEqual(self.order.status, Order.STATUS_PAID)
+
+
+class CreateRoutineTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('sharer', password='pw')
+        self.product = Product.objects.create(name='Daily SPF', brand='Acme', product_type='Sunscreen', skin_type='dry', description='x')
+
+    def form(self, **steps):
+        data = {
+            'title': 'Morning glow', 'description': 'Three steps', 'skin_type': 'dry',
+            'routine_type': 'morning', 'is_public': 'true', 'step_count': '3',
+        }
+        data.update(steps)
+        return data
+
+    def test_valid_form_creates_routine_with_renumbered_steps(self):
+        routine = routines.create_routine(self.user, self.form(
+            step_name_1='Cleanse', step_instructions_1='Rinse',
+            # Step 2 was removed in the form
+            step_name_3='Protect', step_instructions_3='Apply', step_product_3=str(self.product.id),
+        ))
+        self.assertTrue(routine.is_public)
+        self.assertEqual(
+            list(routine.steps.order_by('step_number').values_list('step_number', 'step_name', 'product')),
+            [(1, 'Cleanse', None), (2, 'Protect', self.product.id)],
+        )
+        self.assertEqual(list(routine.products.all()), [self.product])
+
+    def test_every_problem_is_reported_and_nothing_is_written(self):
+        with self.assertRaises(ValidationError) as raised:
+            routines.create_routine(self.user, self.form(
+                title=' ', skin_type='scaly',
+                step_name_1='Cleanse',
+                step_name_2='Treat', step_instructions_2='Dab', step_product_2='abc',
+                step_name_3='Protect', step_instructions_3='Apply', step_product_3='999999',
+            ))
+        self.assertEqual(raised.exception.messages, [
+            'Please give your routine a title.',
+            'Please choose a skin type.',
+            'Step 1 needs both a name and instructions.',
+            'Step 2 has an invalid product.',
+            'Step 3 refers to a product that does not exist.',
+        ])
+        self.assertFalse(UserRoutine.objects.exists())
+
+        with self.assertRaises(ValidationError):
+            routines.create_routine(self.user, self.form(step_count=str(routines.MAX_STEPS + 1)))
+
+
+@override_settings(ROUTINE_VIEW_FLUSH_INTERVAL=0)
+class RoutineViewCountTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+        self.addCleanup(view_counts.flush)
+        user = User.objects.create_user('viewer', password='pw')
+        self.routine = UserRoutine.objects.create(
+            user=user, title='Night', description='x', skin_type='dry', routine_type='evening',
+        )
+
+    def test_views_are_buffered_deduplicated_and_flushed(self):
+        with mock.patch('products.view_counts.atexit.register') as register:
+            self.assertTrue(view_counts.record_view(self.routine.pk, 'u1'))
+            self.assertFalse(view_counts.record_view(self.routine.pk, 'u1'))
+            self.assertTrue(view_counts.record_view(self.routine.pk, 'u2'))
+        # No background flusher, so nothing to flush at exit either
+        register.assert_not_called()
+        self.assertEqual(view_counts.pending_views(self.routine.pk), 2)
+        self.routine.refresh_from_db()
+        self.assertEqual(self.routine.views_count, 0)
+
+        self.assertEqual(view_counts.flush(), 2)
+        self.assertEqual(view_counts.pending_views(self.routine.pk), 0)
+        self.routine.refresh_from_db()
+        self.assertEqual(self.routine.views_count, 2)
+
+    def test_failed_flush_keeps_the_views(self):
+        view_counts.record_view(self.routine.pk, 'u1')
+        with mock.patch('products.view_counts.UserRoutine.objects.filter', side_effect=OperationalError('db busy')):
+            with self.assertLogs('products.view_counts', 'ERROR'):
+                self.assertEqual(view_counts.flush(), 0)
+        self.assertEqual(view_counts.pending_views(self.routine.pk), 1)
+        self.assertEqual(view_counts.flush(), 1)
+
+
+@override_settings(ROUTINE_VIEW_FLUSH_INTERVAL=0)
+class ViewRoutineQueryTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('author', password='secret')
+        self.client.login(username='author', password='secret')
+        self.addCleanup(view_counts.flush)
+
+    def make_routine(self, step_count):
+        routine = UserRoutine.objects.create(
+            user=self.user, title=f'{step_count} steps', description='Daily routine',
+            skin_type='dry', routine_type='morning',
+        )
+        products = [
+            Product.objects.create(
+                name=f'Product {routine.pk}-{i}', brand='Brand', product_type='Serum',
+                skin_type='dry', description='Serum',
+            )
+            for i in range(step_count)
+        ]
+        RoutineStep.objects.bulk_create([
+            RoutineStep(routine=routine, step_number=i + 1, step_name=f'Step {i + 1}', instructions='Apply', product=product)
+            for i, product in enumerate(products)
+        ])
+        routine.products.add(*products)
+        return routine
+
+    def render(self, routine):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('view_routine', args=[routine.pk]))
+        self.assertEqual(response.status_code, 200)
+        return response, len(queries)
+
+    def test_query_count_does_not_grow_with_steps(self):
+        # Warm the cart badge cache so both renders do the same work
+        self.render(self.make_routine(1))
+        _, baseline = self.render(self.make_routine(1))
+        response, queries = self.render(self.make_routine(10))
+
+        self.assertEqual(queries, baseline)
+        self.assertContains(response, 'Step 10')
+
+
+class AdminDashboardTests(TestCase):
+    def setUp(self):
+        # The navbar cart count is cached per user id
+        cache.clear()
+        self.addCleanup(cache.clear)
+        self.staff = User.objects.create_user('analyst', password='pw', is_staff=True)
+        SkinProfile.objects.create(user=self.staff, skin_type='dry', scores={'dry': 5})
+        Product.objects.create(name='Barrier Cream', brand='Acme', skin_type='dry', product_type='Cream', description='x')
+        self.client.login(username='analyst', password='pw')
+
+    def test_renders_from_latest_snapshot(self):
+        analytics.take_snapshot()
+        Product.objects.create(name='Later Serum', brand='Acme', skin_type='dry', product_type='Serum', description='x')
+        # Session, user, the navbar cart count and the snapshot
+        with self.assertNumQueries(4):
+            response = self.client.get(reverse('admin_dashboard'))
+        self.assertEqual(response.context['total_products'], 1)
+        self.assertEqual(response.context['skin_type_distribution'], [{'skin_type': 'Dry', 'count': 1, 'percentage': 100.0}])
+
+        response = self.client.get(reverse('admin_dashboard') + '?live=1')
+        self.assertEqual(response.context['total_products'], 2)
+        self.assertEqual(AnalyticsSnapshot.objects.count(), 1)
+
+    def test_only_staff_take_the_first_snapshot(self):
+        User.objects.create_user('shopper', password='pw')
+        self.client.login(username='shopper', password='pw')
+        response = self.client.get(reverse('admin_dashboard') + '?live=1')
+        self.assertContains(response, 'refresh_analytics')
+        self.assertFalse(AnalyticsSnapshot.objects.exists())
+
+        self.client.login(username='analyst', password='pw')
+        response = self.client.get(reverse('admin_dashboard'))
+        self.assertEqual(response.context['total_products'], 1)
+        self.assertEqual(AnalyticsSnapshot.objects.count(), 1)
+
+
+class SiteCountsTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+
+    def test_counts_follow_saves_and_deletes_without_recounting(self):
+        self.assertEqual(site_counts.get_counts()['products'], 0)
+        with self.captureOnCommitCallbacks(execute=True):
+            product = Product.objects.create(name='Gel', brand='Acme', skin_type='oily', product_type='Gel', description='x')
+            User.objects.create_user('counted')
+        with self.assertNumQueries(0):
+            counts = site_counts.get_counts()
+        self.assertEqual((counts['products'], counts['users']), (1, 1))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            product.delete()
+        self.assertEqual(site_counts.get_counts()['products'], 0)
@@ -7,9 +7,15 @@ urlpatterns = [
     path('cart/', views.view_cart, name='view_cart'),
     path('cart/update/<int:item_id>/', views.update_cart, name='update_cart'),
     path('cart/clear/', views.clear_cart, name='clear_cart'),
+    path('api/cart/add/', views.api_cart_add, name='api_cart_add'),
+    path('api/cart/update/', views.api_cart_update, name='api_cart_update'),
+    path('api/cart/remove/', views.api_cart_remove, name='api_cart_remove'),
+    path('api/cart/bulk-set/', views.api_cart_bulk_set, name='api_cart_bulk_set'),
+    path('api/products/autocomplete/', views.api_product_autocomplete, name='api_product_autocomplete'),
     path('checkout/', views.checkout, name='checkout'),
     path('process-payment/', views.process_payment, name='process_payment'),
     path('payment-success/<str:order_id>/', views.payment_success, name='payment_success'),
+    path('webhooks/razorpay/', views.razorpay_webhook, name='razorpay_webhook'),
     
     # Community features
     path('community/', views.community_hub, name='community_hub'),
@@ -0,0 +1,118 @@
+"""Write-behind routine view counter.
+
+Page views are tallied in an in-process buffer and written out in batches
+(``views_count = views_count + n``) by a daemon thread every
+``ROUTINE_VIEW_FLUSH_INTERVAL`` seconds and at interpreter exit, so a popular
+routine costs one UPDATE per interval instead of one per page view. With an
+interval of 0 (as in tests) nothing is flushed automatically; call
+``flush`` yourself.
+
+A viewer (user, else session, else client address) is counted at most once
+per ``ROUTINE_VIEW_DEDUP_SECONDS``; the window lives in the shared cache so
+it holds across processes. Views buffered when a process is killed outright
+are lost, which is an acceptable trade for a popularity counter.
+"""
+import atexit
+import logging
+import os
+import threading
+import time
+from collections import Counter, defaultdict
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import close_old_connections, transaction
+from django.db.models import F
+
+from .models import UserRoutine
+
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_FLUSH_INTERVAL = 10
+DEFAULT_DEDUP_SECONDS = 30 * 60
+
+_pending = Counter()
+_lock = threading.Lock()
+_flusher_pid = None
+_exit_flush_registered = False
+
+
+def viewer_key(request):
+    """Who is viewing, for de-duplicating refreshes"""
+    if request.user.is_authenticated:
+        return f'u{request.user.pk}'
+    session_key = getattr(request, 'session', None) and request.session.session_key
+    if session_key:
+        return f's{session_key}'
+    return f"a{request.META.get('REMOTE_ADDR', '')}"
+
+
+def record_view(routine_id, viewer=None):
+    """Buffer one view of ``routine_id``; returns False if ``viewer`` was already counted recently"""
+    window = getattr(settings, 'ROUTINE_VIEW_DEDUP_SECONDS', DEFAULT_DEDUP_SECONDS)
+    if viewer and window and not cache.add(f'routine_viewed:{routine_id}:{viewer}', 1, window):
+        return False
+    _ensure_flusher()
+    with _lock:
+        _pending[routine_id] += 1
+    return True
+
+
+def pending_views(routine_id):
+    """Views of ``routine_id`` buffered in this process and not yet written"""
+    with _lock:
+        return _pending.get(routine_id, 0)
+
+
+def flush():
+    """Write the buffered views to the database; returns the number of views written"""
+    global _pending
+    with _lock:
+        batch, _pending = _pending, Counter()
+    if not batch:
+        return 0
+
+    # Routines with the same pending count share one UPDATE
+    by_count = defaultdict(list)
+    for routine_id, count in batch.items():
+        by_count[count].append(routine_id)
+    try:
+        with transaction.atomic():
+            for count, routine_ids in by_count.items():
+                UserRoutine.objects.filter(pk__in=routine_ids).update(views_count=F('views_count') + count)
+    except Exception:
+        logger.exception('Could not flush routine view counts; keeping them for the next flush')
+        with _lock:
+            _pending.update(batch)
+        return 0
+    return sum(batch.values())
+
+
+def _run_flusher(interval):
+    while True:
+        time.sleep(interval)
+        try:
+            flush()
+        finally:
+            close_old_connections()
+
+
+def _ensure_flusher():
+    """Start this process's flush thread on first use (again after a fork)"""
+    global _flusher_pid, _exit_flush_registered
+    interval = getattr(settings, 'ROUTINE_VIEW_FLUSH_INTERVAL', DEFAULT_FLUSH_INTERVAL)
+    if not interval or _flusher_pid == os.getpid():
+        return
+    with _lock:
+        if _flusher_pid == os.getpid():
+            return
+        if _flusher_pid is not None:
+            # Forked worker: the parent still owns and flushes what it had buffered
+            _pending.clear()
+        _flusher_pid = os.getpid()
+        if not _exit_flush_registered:
+            # Only processes that flush in the background flush at exit too
+            atexit.register(flush)
+            _exit_flush_registered = True
+    threading.Thread(target=_run_flusher, args=(interval,), name='routine-view-flush', daemon=True).start()
@@ -1,11 +1,19 @@
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
-from .models import Product, Cart, CartItem, ProductReview, UserRoutine, RoutineStep, ReviewHelpful, RoutineLike, SkincareReminder
-from django.db.models import Avg, Count, Q
-from decimal import Decimal
-import razorpay
-from django.conf import settings
+from .models import Product, Cart, CartItem, Order, ProductReview, UserRoutine, RoutineStep, RoutineLike, SkincareReminder
+from .pagination import paginate_products, DEFAULT_SORT
+from .search import search_products
+from . import cart as cart_service
+from .orders import get_checkout_order, mark_order_paid
+from . import community, engagement, payments, view_counts
+from .routines import create_routine
+from .webhooks import record_event
+from django.core.exceptions import ValidationError
+from django.http import HttpResponse, JsonResponse
+from django.views.decorators.cache import cache_control
+from django.views.decorators.http import require_GET, require_POST
+from django.db.models import Prefetch, Q
 from django.views.decorators.csrf import csrf_exempt
 import json
 
@@ -17,46 +25,60 @@ def product_list(request):
     if skin_type:
         products = products.filter(skin_type=skin_type)
     
-    # Get cart item count for logged-in users
-    cart_count = 0
-    if request.user.is_authenticated:
-        cart, created = Cart.objects.get_or_create(user=request.user)
-        cart_count = cart.get_total_items()
-    
+    query = request.GET.get('q', '').strip()
+    if query:
+        # Ranked search results, paged by relevance
+        try:
+            page_number = int(request.GET.get('page', 1))
+        except ValueError:
+            page_number = 1
+        page = search_products(query, queryset=products, page=page_number)
+        page['sort'] = 'relevance'
+    else:
+        # One bounded keyset page instead of the whole catalog
+        page = paginate_products(
+            products,
+            sort=request.GET.get('sort', DEFAULT_SORT),
+            after=request.GET.get('after'),
+            before=request.GET.get('before'),
+        )
+    
+    # The cart badge comes from the cart_summary context processor
     return render(request, 'products/product_list.html', {
-        'products': products,
-        'cart_count': cart_count
+        'products': page['items'],
+        'page': page,
+        'sort': page['sort'],
+        'query': query,
+        'skin_type': skin_type or '',
     })
 
 
-@login_required
 def add_to_cart(request, product_id):
     product = get_object_or_404(Product, id=product_id)
-    cart, created = Cart.objects.get_or_create(user=request.user)
+    cart = cart_service.active_cart(request)
     
-    # Get or create cart item
-    cart_item, created = CartItem.objects.get_or_create(
-        cart=cart,
-        product=product,
-        defaults={'quantity': 1}
-    )
-    
-    if not created:
-        # If item already exists, increment quantity
-        cart_item.quantity += 1
-        cart_item.save()
-        messages.success(request, f'Updated {product.name} quantity in cart!')
+    try:
+        quantity = cart.add_item(product)
+    except ValueError as e:
+        messages.error(request, str(e))
     else:
-        messages.success(request, f'{product.name} added to cart!')
+        if quantity > 1:
+            messages.success(request, f'Updated {product.name} quantity in cart!')
+        else:
+            messages.success(request, f'{product.name} added to cart!')
     
     # Redirect back to the page they came from
     return redirect(request.META.get('HTTP_REFERER', 'product_list'))
 
 
-@login_required
 def view_cart(request):
-    cart, created = Cart.objects.get_or_create(user=request.user)
-    cart_items = cart.items.select_related('product').all()
+    if request.user.is_authenticated:
+        cart, created = Cart.objects.get_or_create(user=request.user)
+        cart_items = cart.items.select_related('product').all()
+    else:
+        # Guests browse from the signed cookie; nothing is written to the database
+        cart = request.guest_cart
+        cart_items = cart.items()
     
     return render(request, 'products/cart.html', {
         'cart': cart,
@@ -64,100 +86,256 @@ def view_cart(request):
     })
 
 
-@login_required
 def update_cart(request, item_id):
-    cart_item = get_object_or_404(CartItem, id=item_id, cart__user=request.user)
+    if request.user.is_authenticated:
+        cart_item = get_object_or_404(CartItem.objects.select_related('product'), id=item_id, cart__user=request.user)
+        product = cart_item.product
+    else:
+        # Guest cart lines are identified by their product id
+        product = get_object_or_404(Product, id=item_id)
+    cart = cart_service.active_cart(request)
     
     if request.method == 'POST':
         action = request.POST.get('action')
         
         if action == 'increase':
-            cart_item.quantity += 1
-            cart_item.save()
-            messages.success(request, 'Quantity updated!')
+            try:
+                cart.add_item(product)
+                messages.success(request, 'Quantity updated!')
+            except ValueError as e:
+                messages.error(request, str(e))
         elif action == 'decrease':
-            if cart_item.quantity > 1:
-                cart_item.quantity -= 1
-                cart_item.save()
+            if cart.remove_units(product):
                 messages.success(request, 'Quantity updated!')
             else:
-                cart_item.delete()
                 messages.success(request, 'Item removed from cart!')
         elif action == 'remove':
-            cart_item.delete()
+            cart.remove_item(product)
             messages.success(request, 'Item removed from cart!')
     
     return redirect('view_cart')
 
 
-@login_required
 def clear_cart(request):
-    cart = get_object_or_404(Cart, user=request.user)
-    cart.items.all().delete()
+    if request.user.is_authenticated:
+        cart = get_object_or_404(Cart, user=request.user)
+        cart_service.empty_cart(cart)
+    else:
+        request.guest_cart.empty()
     messages.success(request, 'Cart cleared!')
     return redirect('view_cart')
 
 
+# Cart JSON API (works for guests and signed-in users alike)
+
+def _cart_payload(cart, product_id=None, quantity=None):
+    totals = cart.totals()
+    payload = {
+        'ok': True,
+        'cart': {'total_items': totals['total_items'], 'subtotal': str(totals['subtotal'])},
+    }
+    if product_id is not None:
+        payload['item'] = {'product_id': product_id, 'quantity': quantity}
+    return payload
+
+
+def _request_data(request):
+    """Accept either a JSON body or a regular form post"""
+    if request.content_type == 'application/json':
+        try:
+            data = json.loads(request.body or b'{}')
+        except ValueError:
+            return None
+        return data if isinstance(data, dict) else None
+    return request.POST
+
+
+def _parse_quantity(value, default=None, minimum=0):
+    if value is None:
+        return default
+    try:
+        quantity = int(value)
+    except (TypeError, ValueError):
+        return None
+    if quantity < minimum or quantity > cart_service.MAX_QUANTITY:
+        return None
+    return quantity
+
+
+def _requested_product(data):
+    product_id = str(data.get('product_id', ''))
+    if not product_id.isdigit():
+        return None
+    return Product.objects.filter(id=int(product_id)).first()
+
+
+def _json_error(message, status=400):
+    return JsonResponse({'ok': False, 'error': message}, status=status)
+
+
+@require_POST
+def api_cart_add(request):
+    """Add units of a product: {"product_id": 1, "quantity": 1}"""
+    data = _request_data(request)
+    if data is None:
+        return _json_error('Invalid JSON body')
+    quantity = _parse_quantity(data.get('quantity'), default=1, minimum=1)
+    if quantity is None:
+        return _json_error('Invalid quantity')
+    product = _requested_product(data)
+    if product is None:
+        return _json_error('Product not found', status=404)
+
+    cart = cart_service.active_cart(request)
+    try:
+        new_quantity = cart.add_item(product, quantity)
+    except ValueError as e:
+        return _json_error(str(e))
+    return JsonResponse(_cart_payload(cart, product.id, new_quantity))
+
+
+@require_POST
+def api_cart_update(request):
+    """Change a product's quantity by a signed delta: {"product_id": 1, "delta": -1}"""
+    data = _request_data(request)
+    if data is None:
+        return _json_error('Invalid JSON body')
+    try:
+        delta = int(data.get('delta'))
+    except (TypeError, ValueError):
+        return _json_error('Invalid delta')
+    if not delta or abs(delta) > cart_service.MAX_QUANTITY:
+        return _json_error('Invalid delta')
+    product = _requested_product(data)
+    if product is None:
+        return _json_error('Product not found', status=404)
+
+    cart = cart_service.active_cart(request)
+    try:
+        if delta > 0:
+            new_quantity = cart.add_item(product, delta)
+        else:
+            new_quantity = cart.remove_units(product, -delta)
+    except ValueError as e:
+        return _json_error(str(e))
+    return JsonResponse(_cart_payload(cart, product.id, new_quantity))
+
+
+@require_POST
+def api_cart_remove(request):
+    """Remove a product from the cart: {"product_id": 1}"""
+    data = _request_data(request)
+    if data is None:
+        return _json_error('Invalid JSON body')
+    product = _requested_product(data)
+    if product is None:
+        return _json_error('Product not found', status=404)
+
+    cart = cart_service.active_cart(request)
+    cart.remove_item(product)
+    return JsonResponse(_cart_payload(cart, product.id, 0))
+
+
+@require_POST
+def api_cart_bulk_set(request):
+    """Set several quantities at once: {"items": {"1": 2, "5": 0}}"""
+    data = _request_data(request)
+    items = data.get('items') if data is not None else None
+    if not isinstance(items, dict) or not items:
+        return _json_error('Expected an "items" object of product_id -> quantity')
+
+    requested = {}
+    for product_id, value in items.items():
+        quantity = _parse_quantity(value)
+        if not str(product_id).isdigit() or quantity is None:
+            return _json_error(f'Invalid entry for product {product_id}')
+        requested[int(product_id)] = quantity
+
+    products = Product.objects.in_bulk(list(requested))
+    missing = set(requested) - set(products)
+    if missing:
+        return _json_error(f'Products not found: {sorted(missing)}', status=404)
+
+    cart = cart_service.active_cart(request)
+    try:
+        cart.bulk_set_quantities({products[pid]: qty for pid, qty in requested.items()})
+    except ValueError as e:
+        return _json_error(str(e))
+    payload = _cart_payload(cart)
+    payload['items'] = [{'product_id': pid, 'quantity': qty} for pid, qty in requested.items()]
+    return JsonResponse(payload)
+
+
+AUTOCOMPLETE_PAGE_SIZE = 20
+
+
+@require_GET
+@cache_control(public=True, max_age=300)
+def api_product_autocomplete(request):
+    """Product picker options: ?q=<name or brand prefix>&skin_type=dry&after=<cursor>"""
+    products = Product.objects.all()
+    query = request.GET.get('q', '').strip()[:50]
+    if query:
+        # Served by the UPPER(...) prefix indexes from migration 0015 on PostgreSQL
+        products = products.filter(Q(name__istartswith=query) | Q(brand__istartswith=query))
+    skin_type = request.GET.get('skin_type')
+    if skin_type:
+        products = products.filter(skin_type=skin_type)
+    
+    page = paginate_products(
+        products.only('id', 'name', 'brand', 'skin_type'),
+        sort='name',
+        after=request.GET.get('after'),
+        page_size=AUTOCOMPLETE_PAGE_SIZE,
+    )
+    return JsonResponse({
+        'results': [
+            {'id': product.id, 'name': product.name, 'brand': product.brand, 'skin_type': product.skin_type}
+            for product in page['items']
+        ],
+        'next': page['next_cursor'] if page['has_next'] else None,
+    })
+
+
 @login_required
 def checkout(request):
     """Checkout page with Razorpay payment"""
     cart, created = Cart.objects.get_or_create(user=request.user)
-    cart_items = cart.items.select_related('product').all()
     
-    if not cart_items:
+    # Snapshot the cart into a pending order (reused until the cart changes)
+    order = get_checkout_order(cart)
+    if order is None:
         messages.warning(request, 'Your cart is empty!')
         return redirect('view_cart')
     
-    # Calculate total
-    subtotal = sum(item.product.price * item.quantity for item in cart_items if item.product.price)
-    tax = subtotal * Decimal('0.18')  # 18% GST
-    total = subtotal + tax
-    
-    # Check if Razorpay keys are configured
-    demo_mode = False
-    razorpay_order_id = 'demo_order_' + str(request.user.id)
-    razorpay_key_id = 'demo_key'
-    
-    if (hasattr(settings, 'RAZORPAY_KEY_ID') and 
-        hasattr(settings, 'RAZORPAY_KEY_SECRET') and
-        'your_key' not in settings.RAZORPAY_KEY_ID.lower() and 
-        'your_key' not in settings.RAZORPAY_KEY_SECRET.lower()):
-        
-        try:
-            # Create Razorpay order
-            client = razorpay.Client(auth=(settings.RAZORPAY_KEY_ID, settings.RAZORPAY_KEY_SECRET))
-            
-            # Convert to paise (Razorpay uses smallest currency unit)
-            amount_in_paise = int(total * 100)
-            
-            razorpay_order = client.order.create({
-                'amount': amount_in_paise,
-                'currency': 'INR',
-                'payment_capture': '1'
-            })
-            
-            razorpay_order_id = razorpay_order['id']
-            razorpay_key_id = settings.RAZORPAY_KEY_ID
-            
-        except razorpay.errors.BadRequestError as e:
-            messages.warning(request, '⚠️ Running in Demo Mode - Razorpay not configured')
-            demo_mode = True
-        except Exception as e:
-            messages.warning(request, f'⚠️ Running in Demo Mode - {str(e)}')
-            demo_mode = True
-    else:
+    # Demo mode only when no gateway is configured at all; a failing gateway is an error
+    gateway = payments.get_gateway()
+    demo_mode = gateway is None
+    if demo_mode:
         messages.info(request, '🛠️ Demo Mode Active - Configure Razorpay keys in settings.py for real payments')
-        demo_mode = True
+        razorpay_order_id = f'demo_order_{order.pk}'
+        razorpay_key_id = 'demo_key'
+        if order.razorpay_order_id is None:
+            order.razorpay_order_id = razorpay_order_id
+            order.save(update_fields=['razorpay_order_id'])
+    else:
+        try:
+            # Created once per order; refreshing checkout reuses it
+            razorpay_order_id = payments.ensure_gateway_order(order, gateway)
+        except payments.GatewayError as e:
+            messages.error(request, f'❌ Could not start the payment: {str(e)}. Please try again.')
+            return redirect('view_cart')
+        razorpay_key_id = gateway.key_id
     
     return render(request, 'products/checkout.html', {
-        'cart': cart,
-        'cart_items': cart_items,
-        'subtotal': subtotal,
-        'tax': tax,
-        'total': total,
+        'order': order,
+        'order_items': order.items.select_related('product'),
+        'subtotal': order.subtotal,
+        'tax': order.tax,
+        'total': order.total,
         'razorpay_order_id': razorpay_order_id,
         'razorpay_key_id': razorpay_key_id,
-        'amount_in_paise': int(total * 100),
+        'amount_in_paise': order.amount_in_paise,
         'user_name': request.user.get_full_name() or request.user.username,
         'user_email': request.user.email,
         'demo_mode': demo_mode,
@@ -168,59 +346,64 @@ def checkout(request):
 def process_payment(request):
     """Process Razorpay payment verification"""
     if request.method == 'POST':
-        # Check for demo mode
+        if not request.user.is_authenticated:
+            return redirect('login')
+        
         payment_id = request.POST.get('razorpay_payment_id', '')
         order_id = request.POST.get('razorpay_order_id', '')
+        order = Order.objects.filter(user=request.user, razorpay_order_id=order_id).first()
+        if order is None:
+            messages.error(request, '❌ Order not found! Please try again.')
+            return redirect('checkout')
         
-        if order_id.startswith('demo_order_') or payment_id.startswith('demo_pay_'):
+        # Demo mode is decided by the order, never by the posted payment id, and
+        # only honoured while no real gateway is configured
+        if order.razorpay_order_id.startswith('demo_order_') and payments.get_gateway() is None:
             # Demo mode - simulate successful payment
-            cart = Cart.objects.filter(user=request.user).first()
-            if cart:
-                cart.items.all().delete()
-            
-            messages.success(request, f'🎉 Demo Payment Successful! Order ID: {order_id}')
-            return redirect('payment_success', order_id=payment_id or order_id)
+            mark_order_paid(order, payment_id)
+            messages.success(request, f'🎉 Demo Payment Successful! Order ID: {order.pk}')
+            return redirect('payment_success', order_id=order.pk)
         
-        try:
-            # Real Razorpay payment verification
-            signature = request.POST.get('razorpay_signature')
-            
-            # Verify payment signature
-            client = razorpay.Client(auth=(settings.RAZORPAY_KEY_ID, settings.RAZORPAY_KEY_SECRET))
-            
-            params_dict = {
-                'razorpay_order_id': order_id,
-                'razorpay_payment_id': payment_id,
-                'razorpay_signature': signature
-            }
-            
-            # Verify signature
-            client.utility.verify_payment_signature(params_dict)
-            
-            # Payment is successful
-            cart = get_object_or_404(Cart, user=request.user)
-            
-            # Clear the cart
-            cart.items.all().delete()
-            
-            messages.success(request, f'🎉 Payment Successful! Payment ID: {payment_id}')
-            return redirect('payment_success', order_id=payment_id)
-            
-        except razorpay.errors.SignatureVerificationError:
+        # Real Razorpay payment: verify the signature locally
+        signature = request.POST.get('razorpay_signature')
+        if not payments.verify_payment_signature(order_id, payment_id, signature):
+            Order.objects.filter(pk=order.pk, status=Order.STATUS_PENDING).update(status=Order.STATUS_FAILED)
             messages.error(request, '❌ Payment verification failed! Please try again.')
             return redirect('checkout')
-        except Exception as e:
-            messages.error(request, f'❌ Payment failed: {str(e)}')
-            return redirect('checkout')
+        
+        # Payment is successful: mark the order paid and clear the cart
+        mark_order_paid(order, payment_id)
+        
+        messages.success(request, f'🎉 Payment Successful! Payment ID: {payment_id}')
+        return redirect('payment_success', order_id=order.pk)
     
     return redirect('checkout')
 
 
+@csrf_exempt
+@require_POST
+def razorpay_webhook(request):
+    """Razorpay webhook: verify and queue the event; process_payment_events applies it"""
+    body = request.body
+    if not payments.verify_webhook_signature(body, request.headers.get('X-Razorpay-Signature')):
+        return HttpResponse('Invalid signature', status=400)
+    try:
+        record_event(body, request.headers.get('X-Razorpay-Event-Id'))
+    except ValueError:
+        return HttpResponse('Invalid payload', status=400)
+    return HttpResponse('OK')
+
+
 @login_required
 def payment_success(request, order_id):
     """Payment success page"""
+    if not str(order_id).isdigit():
+        return redirect('product_list')
+    order = get_object_or_404(Order, pk=order_id, user=request.user)
     return render(request, 'products/payment_success.html', {
-        'order_id': order_id
+        'order': order,
+        'order_items': order.items.all(),
+        'order_id': order.pk,
     })
 
 
@@ -228,33 +411,9 @@ def payment_success(request, order_id):
 
 def community_hub(request):
     """Main community page with reviews and routines"""
-    # Get recent reviews
-    recent_reviews = ProductReview.objects.select_related('user', 'product').all()[:10]
-    
-    # Get popular routines
-    popular_routines = UserRoutine.objects.filter(is_public=True).select_related('user').order_by('-likes_count', '-views_count')[:8]
-    
-    # Get top rated products
-    top_products = Product.objects.annotate(
-        avg_rating=Avg('reviews__rating'),
-        review_count=Count('reviews')
-    ).filter(review_count__gt=0).order_by('-avg_rating')[:6]
-    
-    # Statistics
-    stats = {
-        'total_reviews': ProductReview.objects.count(),
-        'total_routines': UserRoutine.objects.filter(is_public=True).count(),
-        'total_members': ProductReview.objects.values('user').distinct().count()
-    }
-    
-    context = {
-        'recent_reviews': recent_reviews,
-        'popular_routines': popular_routines,
-        'top_products': top_products,
-        'stats': stats
-    }
-    
-    return render(request, 'products/community_hub.html', context)
+    # Sections are cached under versioned keys (see products.community); the
+    # template also caches each rendered section against the same versions
+    return render(request, 'products/community_hub.html', community.hub_context())
 
 
 @login_required
@@ -297,20 +456,13 @@ def add_review(request, product_id):
 
 @login_required
 def mark_helpful(request, review_id):
-    """Mark a review as helpful"""
+    """Mark a review as helpful, or take the vote back"""
     review = get_object_or_404(ProductReview, id=review_id)
     
-    helpful, created = ReviewHelpful.objects.get_or_create(
-        review=review,
-        user=request.user
-    )
-    
-    if created:
-        review.helpful_count += 1
-        review.save()
+    if engagement.toggle_review_helpful(review, request.user):
         messages.success(request, 'Thanks for your feedback!')
     else:
-        messages.info(request, 'You already marked this as helpful!')
+        messages.info(request, 'Removed your helpful vote')
     
     return redirect('community_hub')
 
@@ -320,54 +472,33 @@ def share_routine(request):
     """Share a new skincare routine"""
     if request.method == 'POST':
         try:
-            routine = UserRoutine.objects.create(
-                user=request.user,
-                title=request.POST.get('title'),
-                description=request.POST.get('description'),
-                skin_type=request.POST.get('skin_type'),
-                routine_type=request.POST.get('routine_type'),
-                is_public=request.POST.get('is_public') == 'on'
-            )
-            
-            # Add steps
-            step_count = int(request.POST.get('step_count', 0))
-            for i in range(1, step_count + 1):
-                step_name = request.POST.get(f'step_name_{i}')
-                step_instructions = request.POST.get(f'step_instructions_{i}')
-                product_id = request.POST.get(f'step_product_{i}')
-                
-                if step_name and step_instructions:
-                    step = RoutineStep.objects.create(
-                        routine=routine,
-                        step_number=i,
-                        step_name=step_name,
-                        instructions=step_instructions
-                    )
-                    if product_id:
-                        try:
-                            product = Product.objects.get(id=int(product_id))
-                            step.product = product
-                            step.save()
-                        except:
-                            pass
-            
+            create_routine(request.user, request.POST)
+        except ValidationError as e:
+            for error in e.messages:
+                messages.error(request, error)
+        else:
             messages.success(request, '✅ Routine shared successfully!')
             return redirect('community_hub')
-        except Exception as e:
-            messages.error(request, f'Error sharing routine: {str(e)}')
     
-    products = Product.objects.all()
-    return render(request, 'products/share_routine.html', {'products': products})
+    # Product options are fetched on demand from api_product_autocomplete
+    return render(request, 'products/share_routine.html')
 
 
 @login_required
 def view_routine(request, routine_id):
     """View detailed routine"""
-    routine = get_object_or_404(UserRoutine, id=routine_id)
+    # The whole page renders from this one prefetched graph, whatever the step count
+    routine = get_object_or_404(
+        UserRoutine.objects.select_related('user').prefetch_related(
+            Prefetch('steps', queryset=RoutineStep.objects.select_related('product')),
+            'products',
+        ),
+        id=routine_id,
+    )
     
-    # Increment views
-    routine.views_count += 1
-    routine.save(update_fields=['views_count'])
+    # Views are buffered and written in batches by products.view_counts
+    view_counts.record_view(routine.id, view_counts.viewer_key(request))
+    routine.views_count += view_counts.pending_views(routine.id)
     
     # Check if user liked this
     user_liked = RoutineLike.objects.filter(routine=routine, user=request.user).exists() if request.user.is_authenticated else False
@@ -387,19 +518,9 @@ def like_routine(request, routine_id):
     """Like/unlike a routine"""
     routine = get_object_or_404(UserRoutine, id=routine_id)
     
-    like, created = RoutineLike.objects.get_or_create(
-        routine=routine,
-        user=request.user
-    )
-    
-    if created:
-        routine.likes_count += 1
-        routine.save()
+    if engagement.toggle_routine_like(routine, request.user):
         messages.success(request, '❤️ Routine liked!')
     else:
-        like.delete()
-        routine.likes_count = max(0, routine.likes_count - 1)
-        routine.save()
         messages.info(request, 'Routine unliked')
     
     return redirect('view_routine', routine_id=routine_id)
@@ -0,0 +1,143 @@
+"""Razorpay webhook outbox.
+
+The webhook view only verifies the signature and appends the delivery to
+``PaymentEvent``; it does no order work, so Razorpay gets its 200 straight
+away. ``python manage.py process_payment_events`` drains the outbox:
+each due event is handled in its own savepoint, transient failures are
+retried with exponential backoff, and handling is idempotent, so a
+redelivered or reprocessed event never pays an order twice. A capture for
+an order that can no longer be paid is left dead, with the reason in
+``last_error``, for someone to reconcile.
+"""
+import hashlib
+import json
+import logging
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .models import Order, PaymentEvent
+from .orders import mark_order_paid
+
+
+DEFAULT_MAX_ATTEMPTS = 8
+RETRY_BASE_DELAY = 30  # seconds; doubled after every failed attempt
+RETRY_MAX_DELAY = 60 * 60
+
+PAID_EVENTS = {'payment.captured', 'order.paid'}
+
+# A capture confirmed by Razorpay outranks a failed browser callback
+# (a dropped redirect, a mangled signature), so failed orders are paid too
+PAYABLE_STATUSES = (Order.STATUS_PENDING, Order.STATUS_FAILED)
+
+logger = logging.getLogger(__name__)
+
+
+class EventRejected(Exception):
+    """The event can never be applied; retrying would not help"""
+
+
+def record_event(body, event_id=None):
+    """
+    Append a verified webhook delivery to the outbox.
+
+    Redeliveries carry the same event id and are dropped by the unique
+    constraint, so this is a single INSERT either way. Raises ValueError for
+    a body that is not a JSON object.
+    """
+    data = json.loads(body)
+    if not isinstance(data, dict):
+        raise ValueError('Webhook body must be a JSON object')
+    if not event_id:
+        event_id = 'sha256:' + hashlib.sha256(body).hexdigest()[:90]
+    PaymentEvent.objects.bulk_create(
+        [PaymentEvent(event_id=event_id, event_type=str(data.get('event', ''))[:50], payload=data)],
+        ignore_conflicts=True,
+    )
+    return event_id
+
+
+def retry_delay(attempts):
+    """Backoff before the next try once ``attempts`` tries have failed"""
+    return timedelta(seconds=min(RETRY_BASE_DELAY * 2 ** (attempts - 1), RETRY_MAX_DELAY))
+
+
+def _payment_entity(payload):
+    try:
+        return payload['payload']['payment']['entity']
+    except (KeyError, TypeError):
+        raise EventRejected('Event has no payment entity')
+
+
+def handle_event(event):
+    """Apply one event; returns the status it should be recorded with"""
+    if event.event_type not in PAID_EVENTS:
+        return PaymentEvent.STATUS_IGNORED
+
+    payment = _payment_entity(event.payload)
+    order = Order.objects.filter(razorpay_order_id=payment.get('order_id')).first()
+    if order is None:
+        # Payments for orders this shop did not create (other integrations on the account)
+        return PaymentEvent.STATUS_IGNORED
+    if payment.get('amount') != order.amount_in_paise or payment.get('currency', order.currency) != order.currency:
+        raise EventRejected(
+            f"Paid {payment.get('amount')} {payment.get('currency')} for order #{order.pk} "
+            f"expecting {order.amount_in_paise} {order.currency}"
+        )
+
+    if not mark_order_paid(order, payment.get('id', ''), from_statuses=PAYABLE_STATUSES):
+        order.refresh_from_db(fields=['status'])
+        if order.status != Order.STATUS_PAID:
+            # Money was taken for an order the shop has given up on: leave the
+            # event dead for reconciliation (a refund or a manual fix)
+            message = f"Payment {payment.get('id')} captured for {order.status} order #{order.pk}"
+            logger.error(message)
+            raise EventRejected(message)
+    return PaymentEvent.STATUS_PROCESSED
+
+
+def process_event(event, now=None):
+    """Handle ``event`` and record the outcome, scheduling a retry on failure"""
+    now = now or timezone.now()
+    max_attempts = getattr(settings, 'PAYMENT_EVENT_MAX_ATTEMPTS', DEFAULT_MAX_ATTEMPTS)
+    event.attempts += 1
+    try:
+        with transaction.atomic():
+            event.status = handle_event(event)
+        event.last_error = ''
+        event.processed_at = now
+    except EventRejected as e:
+        event.status = PaymentEvent.STATUS_DEAD
+        event.last_error = str(e)
+    except Exception as e:
+        event.last_error = f'{type(e).__name__}: {e}'
+        if event.attempts >= max_attempts:
+            event.status = PaymentEvent.STATUS_DEAD
+        else:
+            event.next_attempt_at = now + retry_delay(event.attempts)
+    event.save(update_fields=['status', 'attempts', 'next_attempt_at', 'last_error', 'processed_at'])
+    return event.status
+
+
+def process_due_events(batch_size=100, now=None):
+    """
+    Process up to ``batch_size`` pending events that are due.
+
+    Rows are claimed with ``SELECT ... FOR UPDATE SKIP LOCKED`` so several
+    workers can drain the outbox side by side. Returns a dict of
+    ``{status: count}`` for the batch.
+    """
+    now = now or timezone.now()
+    counts = {}
+    with transaction.atomic():
+        events = list(
+            PaymentEvent.objects.select_for_update(skip_locked=True)
+            .filter(status=PaymentEvent.STATUS_PENDING, next_attempt_at__lte=now)
+            .order_by('next_attempt_at', 'id')[:batch_size]
+        )
+        for event in events:
+            status = process_event(event, now)
+            counts[status] = counts.get(status, 0) + 1
+    return counts
@@ -1,13 +1,28 @@
 from django.contrib import admin
-from .models import Question, Option, UserAnswer, SkinProgress
+from .models import Question, Option, UserAnswer, SkinProfile, SkinProgress, ProgressSummary
 
 admin.site.register(Question)
 admin.site.register(Option)
 admin.site.register(UserAnswer)
 
+
+@admin.register(SkinProfile)
+class SkinProfileAdmin(admin.ModelAdmin):
+    list_display = ['user', 'skin_type', 'computed_at']
+    list_filter = ['skin_type']
+    search_fields = ['user__username']
+    readonly_fields = ['scores', 'computed_at']
+
 @admin.register(SkinProgress)
 class SkinProgressAdmin(admin.ModelAdmin):
     list_display = ['user', 'date', 'satisfaction_rating', 'overall_condition', 'routine_followed']
     list_filter = ['date', 'routine_followed', 'satisfaction_rating']
     search_fields = ['user__username', 'notes']
     date_hierarchy = 'date'
+
+
+@admin.register(ProgressSummary)
+class ProgressSummaryAdmin(admin.ModelAdmin):
+    list_display = ['user', 'entry_count', 'last_entry_date', 'updated_at']
+    search_fields = ['user__username']
+    readonly_fields = [field.name for field in ProgressSummary._meta.fields]
@@ -0,0 +1,81 @@
+"""Quiz answers buffered in the session.
+
+While a user walks the quiz, each answer is kept in their session instead of
+being written to ``UserAnswer``. When the last question is answered the whole
+set is committed at once: one delete of the previous answers, one bulk
+insert and the user's ``SkinProfile``, inside a transaction. Pages that need
+the skin type read the stored profile instead of scoring the answers again.
+"""
+from django.db import transaction
+
+from products import site_counts
+
+from .models import SKIN_TYPE_CHOICES, SkinProfile, UserAnswer
+
+
+ANSWERS_KEY = 'quiz_answers'
+
+# Score order; on a tie the skin type listed first wins
+SKIN_TYPES = [value for value, _ in SKIN_TYPE_CHOICES]
+_SKIN_TYPE_INDEX = {skin_type: index for index, skin_type in enumerate(SKIN_TYPES)}
+
+
+def start(session):
+    """Forget any answers from an unfinished attempt"""
+    session[ANSWERS_KEY] = {}
+
+
+def record_answer(session, qid, option_id):
+    # Session data is JSON, so question ids are stored as strings
+    answers = session.get(ANSWERS_KEY, {})
+    answers[str(qid)] = option_id
+    session[ANSWERS_KEY] = answers
+
+
+def pending_answers(session):
+    """``{question_id: option_id}`` answered so far in this attempt"""
+    return {int(qid): option_id for qid, option_id in session.get(ANSWERS_KEY, {}).items()}
+
+
+def first_unanswered(session, graph):
+    answers = pending_answers(session)
+    for qid in graph.order:
+        if graph.option_skin_type(qid, answers.get(qid)) is None:
+            return qid
+    return None
+
+
+def score(skin_types):
+    """
+    Score a set of answers: ``(skin_type, {skin_type: count})``.
+
+    Counts go into a fixed vector indexed by ``SKIN_TYPES`` and the winner is
+    the highest count, ties going to the earlier skin type, so the result
+    doesn't depend on the order the answers were given in. Returns
+    ``(None, scores)`` when there are no answers.
+    """
+    vector = [0] * len(SKIN_TYPES)
+    for skin_type in skin_types:
+        vector[_SKIN_TYPE_INDEX[skin_type]] += 1
+    scores = dict(zip(SKIN_TYPES, vector))
+    best = max(range(len(vector)), key=lambda index: (vector[index], -index))
+    return (SKIN_TYPES[best] if vector[best] else None), scores
+
+
+def commit_answers(user, session, graph):
+    """Replace the user's stored answers and skin profile with this attempt's; returns the profile"""
+    answers = pending_answers(session)
+    skin_type, scores = score(graph.option_skin_type(qid, answers[qid]) for qid in graph.order)
+    with transaction.atomic():
+        deleted, _ = UserAnswer.objects.filter(user=user).delete()
+        created = UserAnswer.objects.bulk_create([
+            UserAnswer(user=user, question_id=qid, option_id=answers[qid])
+            for qid in graph.order
+        ])
+        # bulk_create skips signals, so the dashboard's answer count is shifted here
+        site_counts.adjust('answers', len(created) - deleted)
+        profile, _ = SkinProfile.objects.update_or_create(
+            user=user, defaults={'skin_type': skin_type, 'scores': scores},
+        )
+    session.pop(ANSWERS_KEY, None)
+    return profile
@@ -0,0 +1,94 @@
+"""Process-wide quiz graph.
+
+The quiz is static content, so the questions, their order, each question's
+position and successor, and every option are loaded once per process and
+served from memory. Question and Option saves/deletes bump a version number
+in the shared cache (see ``quiz.signals``); a process notices the new
+version on its next lookup and reloads, so walking the quiz costs no
+database reads.
+"""
+import threading
+import time
+
+from django.core.cache import cache
+from django.db import transaction
+
+from .models import Question
+
+
+VERSION_KEY = 'quiz:graph:version'
+
+_graph = None
+_lock = threading.Lock()
+
+
+class QuizGraph:
+    def __init__(self, questions, version=None):
+        self.version = version
+        self.order = [question.id for question in questions]
+        self.questions = {question.id: question for question in questions}
+        self.position = {qid: number for number, qid in enumerate(self.order, 1)}
+        self.next = dict(zip(self.order, self.order[1:] + [None]))
+        self.option_skin_types = {
+            question.id: {option.id: option.skin_type for option in question.options.all()}
+            for question in questions
+        }
+
+    @property
+    def total(self):
+        return len(self.order)
+
+    @property
+    def first_id(self):
+        return self.order[0] if self.order else None
+
+    def question(self, qid):
+        return self.questions.get(qid)
+
+    def option_skin_type(self, qid, option_id):
+        """Skin type of ``option_id`` if it belongs to question ``qid``, else None"""
+        return self.option_skin_types.get(qid, {}).get(option_id)
+
+
+def _initial_version():
+    # Millisecond clock, so a version lost to eviction never reuses an old one
+    return int(time.time() * 1000)
+
+
+def _current_version():
+    version = cache.get(VERSION_KEY)
+    if version is None:
+        cache.add(VERSION_KEY, _initial_version(), None)
+        version = cache.get(VERSION_KEY)
+    return version
+
+
+def load_quiz_graph(version=None):
+    questions = list(Question.objects.order_by('id').prefetch_related('options'))
+    return QuizGraph(questions, version)
+
+
+def get_quiz_graph():
+    """The quiz graph for this process, reloaded when the quiz content has changed"""
+    global _graph
+    version = _current_version()
+    graph = _graph
+    if graph is None or graph.version != version:
+        with _lock:
+            graph = _graph
+            if graph is None or graph.version != version:
+                graph = _graph = load_quiz_graph(version)
+    return graph
+
+
+def invalidate_quiz_graph():
+    """Make every process reload the quiz once the surrounding transaction commits"""
+    def bump():
+        global _graph
+        _graph = None
+        try:
+            cache.incr(VERSION_KEY)
+        except ValueError:
+            cache.set(VERSION_KEY, _initial_version(), None)
+
+    transaction.on_commit(bump)
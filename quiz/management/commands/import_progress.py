@@ -0,0 +1,31 @@
+import os
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from quiz.transfer import FORMATS, import_entries
+
+
+class Command(BaseCommand):
+    help = "Import a CSV or JSON Lines file of skin progress entries into a user's history"
+
+    def add_arguments(self, parser):
+        parser.add_argument('username')
+        parser.add_argument('path')
+        parser.add_argument('--format', choices=sorted(FORMATS), help='Defaults to json for .json/.jsonl/.ndjson files, else csv')
+
+    def handle(self, *args, **options):
+        try:
+            user = User.objects.get(username=options['username'])
+        except User.DoesNotExist:
+            raise CommandError(f"No user named {options['username']!r}")
+        fmt = options['format']
+        if not fmt:
+            fmt = 'json' if os.path.splitext(options['path'])[1].lower() in ('.json', '.jsonl', '.ndjson') else 'csv'
+
+        with open(options['path'], 'rb') as f:
+            result = import_entries(user, f, fmt)
+        for error in result['errors']:
+            self.stderr.write(error)
+        self.stdout.write(self.style.SUCCESS(
+            f"✅ Imported {result['created']} entries for {user.username} ({result['skipped']} rows skipped)!"
+        ))
@@ -0,0 +1,47 @@
+# Generated by Django 4.2 on 2026-10-18 18:41
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+SKIN_TYPES = ['dry', 'oily', 'combination', 'sensitive', 'normal']
+
+
+def backfill_skin_profiles(apps, schema_editor):
+    # Same rule as quiz.answers.score: highest count, ties to the earlier skin type
+    UserAnswer = apps.get_model('quiz', 'UserAnswer')
+    SkinProfile = apps.get_model('quiz', 'SkinProfile')
+    scores = {}
+    for user_id, skin_type in UserAnswer.objects.values_list('user_id', 'option__skin_type').iterator():
+        user_scores = scores.setdefault(user_id, dict.fromkeys(SKIN_TYPES, 0))
+        if skin_type in user_scores:
+            user_scores[skin_type] += 1
+    profiles = []
+    for user_id, user_scores in scores.items():
+        best = max(SKIN_TYPES, key=lambda skin_type: (user_scores[skin_type], -SKIN_TYPES.index(skin_type)))
+        if user_scores[best]:
+            profiles.append(SkinProfile(user_id=user_id, skin_type=best, scores=user_scores))
+    SkinProfile.objects.bulk_create(profiles, batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('quiz', '0002_skinprogress'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SkinProfile',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('skin_type', models.CharField(choices=[('dry', 'Dry'), ('oily', 'Oily'), ('combination', 'Combination'), ('sensitive', 'Sensitive'), ('normal', 'Normal')], db_index=True, max_length=20)),
+                ('scores', models.JSONField(default=dict)),
+                ('computed_at', models.DateTimeField(auto_now=True)),
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='skin_profile', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.RunPython(backfill_skin_profiles, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 4.2 on 2026-10-18 18:44
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('quiz', '0003_skinprofile'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProgressSummary',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('entry_count', models.PositiveIntegerField(default=0)),
+                ('satisfaction_sum', models.PositiveIntegerField(default=0)),
+                ('condition_points_sum', models.PositiveIntegerField(default=0)),
+                ('routine_followed_count', models.PositiveIntegerField(default=0)),
+                ('last_entry_date', models.DateField(blank=True, null=True)),
+                ('recent_satisfaction', models.JSONField(default=list)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='progress_summary', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 4.2 on 2026-10-18 18:47
+
+import datetime
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('quiz', '0004_progresssummary'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='skinprogress',
+            name='date',
+            field=models.DateField(default=datetime.date.today),
+        ),
+    ]
@@ -1,3 +1,5 @@
+import datetime
+
 from django.db import models
 from django.contrib.auth.models import User
 
@@ -7,19 +9,19 @@ class Question(models.Model):
         return self.text
 
 
+SKIN_TYPE_CHOICES = [
+    ('dry', 'Dry'),
+    ('oily', 'Oily'),
+    ('combination', 'Combination'),
+    ('sensitive', 'Sensitive'),
+    ('normal', 'Normal')
+]
+
+
 class Option(models.Model):
     question = models.ForeignKey(Question, on_delete=models.CASCADE, related_name='options')
     text = models.CharField(max_length=255)
-    skin_type = models.CharField(
-        max_length=20,
-        choices=[
-            ('dry', 'Dry'),
-            ('oily', 'Oily'),
-            ('combination', 'Combination'),
-            ('sensitive', 'Sensitive'),
-            ('normal', 'Normal')
-        ]
-    )
+    skin_type = models.CharField(max_length=20, choices=SKIN_TYPE_CHOICES)
     def __str__(self):
         return self.text
 
@@ -33,10 +35,23 @@ class UserAnswer(models.Model):
         return f"{self.user.username} - {self.question.text}"
 
 
+class SkinProfile(models.Model):
+    """A user's skin type as scored from their last completed quiz"""
+    user = models.OneToOneField(User, on_delete=models.CASCADE, related_name='skin_profile')
+    skin_type = models.CharField(max_length=20, choices=SKIN_TYPE_CHOICES, db_index=True)
+    # Answers per skin type, e.g. {"dry": 3, "oily": 2, ...}
+    scores = models.JSONField(default=dict)
+    computed_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.user.username} - {self.skin_type}"
+
+
 class SkinProgress(models.Model):
     """Track user's skin condition and satisfaction over time"""
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='skin_progress')
-    date = models.DateField(auto_now_add=True)
+    # A default rather than auto_now_add so imported history keeps its dates
+    date = models.DateField(default=datetime.date.today)
     
     # Satisfaction rating (1-10)
     satisfaction_rating = models.IntegerField(
@@ -83,3 +98,20 @@ class SkinProgress(models.Model):
     def overall_condition(self):
         """Calculate overall skin condition score"""
         return round((self.hydration_level + self.clarity + self.breakouts + self.redness) / 4, 1)
+
+
+class ProgressSummary(models.Model):
+    """Running totals of a user's SkinProgress entries, kept up to date as entries are saved"""
+    user = models.OneToOneField(User, on_delete=models.CASCADE, related_name='progress_summary')
+    entry_count = models.PositiveIntegerField(default=0)
+    satisfaction_sum = models.PositiveIntegerField(default=0)
+    # Sum of hydration + clarity + breakouts + redness over all entries
+    condition_points_sum = models.PositiveIntegerField(default=0)
+    routine_followed_count = models.PositiveIntegerField(default=0)
+    last_entry_date = models.DateField(null=True, blank=True)
+    # Satisfaction ratings of the most recent entries, newest first, for the trend
+    recent_satisfaction = models.JSONField(default=list)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.user.username} - {self.entry_count} entries"
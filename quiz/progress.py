@@ -0,0 +1,199 @@
+"""Skin progress statistics.
+
+Each user's ``ProgressSummary`` holds running totals of their SkinProgress
+entries plus the satisfaction ratings of the latest ``TREND_WINDOW``
+entries. A new entry for the latest date is folded in with one locked
+read-modify-write (see the SkinProgress receivers in ``quiz.signals``);
+backdated entries, edits and deletes rebuild the summary from the entries. The
+progress page then reads its statistics from one row instead of scanning
+the history.
+
+``history_series`` serves longer histories for the progress charts: entries
+are summed per day, week or month in the database and adjacent buckets are
+merged until at most ``max_points`` remain.
+"""
+import math
+
+from django.db import transaction
+from django.db.models import Count, F, Max, Q, Sum
+from django.db.models.functions import Coalesce, TruncDay, TruncMonth, TruncWeek
+from django.utils import timezone
+
+from .models import ProgressSummary, SkinProgress
+
+
+TREND_WINDOW = 30
+
+BUCKETS = {'day': TruncDay, 'week': TruncWeek, 'month': TruncMonth}
+MAX_POINTS = 120
+
+# Chart series -> SkinProgress field
+SERIES_FIELDS = {
+    'satisfaction': 'satisfaction_rating',
+    'hydration': 'hydration_level',
+    'clarity': 'clarity',
+    'breakouts': 'breakouts',
+    'redness': 'redness',
+}
+
+HISTORY_FIELDS = [
+    'id', 'date', 'satisfaction_rating', 'hydration_level', 'clarity',
+    'breakouts', 'redness', 'routine_followed', 'notes',
+]
+
+
+def condition_points():
+    """Hydration + clarity + breakouts + redness; ``SkinProgress.overall_condition`` is this over 4"""
+    return F('hydration_level') + F('clarity') + F('breakouts') + F('redness')
+
+
+def _entry_points(entry):
+    return entry.hydration_level + entry.clarity + entry.breakouts + entry.redness
+
+
+def _summary_values(user_id):
+    entries = SkinProgress.objects.filter(user_id=user_id)
+    totals = entries.aggregate(
+        entry_count=Count('id'),
+        satisfaction_sum=Coalesce(Sum('satisfaction_rating'), 0),
+        condition_points_sum=Coalesce(Sum(condition_points()), 0),
+        routine_followed_count=Count('id', filter=Q(routine_followed=True)),
+        last_entry_date=Max('date'),
+    )
+    totals['recent_satisfaction'] = list(
+        entries.order_by('-date', '-id').values_list('satisfaction_rating', flat=True)[:TREND_WINDOW]
+    )
+    return totals
+
+
+def rebuild_summary(user_id, create=True):
+    """
+    Recompute a user's summary from their entries.
+
+    With ``create=False`` only an existing summary is updated, so deleting a
+    user (which deletes their entries) can't recreate the row.
+    """
+    values = _summary_values(user_id)
+    if create:
+        summary, _ = ProgressSummary.objects.update_or_create(user_id=user_id, defaults=values)
+        return summary
+    ProgressSummary.objects.filter(user_id=user_id).update(updated_at=timezone.now(), **values)
+
+
+def entry_added(entry):
+    """Fold a newly created entry into its user's summary"""
+    with transaction.atomic():
+        summary = ProgressSummary.objects.select_for_update().filter(user_id=entry.user_id).first()
+        if summary is None:
+            # First entry, or a user from before summaries existed
+            return rebuild_summary(entry.user_id)
+        if summary.last_entry_date is not None and entry.date < summary.last_entry_date:
+            # Backdated: it belongs somewhere inside the trend window, not at its front
+            return rebuild_summary(entry.user_id)
+        summary.entry_count += 1
+        summary.satisfaction_sum += entry.satisfaction_rating
+        summary.condition_points_sum += _entry_points(entry)
+        summary.routine_followed_count += int(entry.routine_followed)
+        # Newest by (date, id), as in _summary_values
+        summary.recent_satisfaction = ([entry.satisfaction_rating] + summary.recent_satisfaction)[:TREND_WINDOW]
+        summary.last_entry_date = entry.date
+        summary.save()
+    return summary
+
+
+def get_summary(user):
+    summary = ProgressSummary.objects.filter(user=user).first()
+    if summary is None:
+        summary = rebuild_summary(user.id)
+    return summary
+
+
+def summary_stats(summary):
+    """The statistics shown on the progress page; empty when there are no entries"""
+    count = summary.entry_count
+    if not count:
+        return {}
+    stats = {
+        'avg_satisfaction': round(summary.satisfaction_sum / count, 1),
+        'avg_condition': round(summary.condition_points_sum / 4 / count, 1),
+        'total_entries': count,
+        'routine_compliance': round(summary.routine_followed_count / count * 100, 1),
+    }
+
+    # Trend: the newer half of the recent window against the older half
+    recent = summary.recent_satisfaction
+    mid_point = len(recent) // 2
+    if mid_point > 0:
+        recent_avg = round(sum(recent[:mid_point]) / mid_point, 1)
+        older_avg = round(sum(recent[mid_point:]) / len(recent[mid_point:]), 1)
+        stats['trend'] = 'improving' if recent_avg > older_avg else 'stable' if recent_avg == older_avg else 'declining'
+        stats['trend_diff'] = round(abs(recent_avg - older_avg), 1)
+    return stats
+
+
+def recent_entries(user, limit=TREND_WINDOW):
+    """The latest entries as dicts, newest first, from a single ``values()`` query"""
+    rows = list(
+        SkinProgress.objects.filter(user=user)
+        .order_by('-date', '-id')
+        .values(*HISTORY_FIELDS, condition_points=condition_points())[:limit]
+    )
+    for row in rows:
+        row['overall_condition'] = round(row['condition_points'] / 4, 1)
+    return rows
+
+
+def _merge(buckets):
+    merged = {'period': buckets[0]['period']}
+    for key in ['entries', 'followed', 'condition_points', *(f'{name}_sum' for name in SERIES_FIELDS)]:
+        merged[key] = sum(bucket[key] for bucket in buckets)
+    return merged
+
+
+def history_series(user, start=None, end=None, bucket='day', max_points=MAX_POINTS):
+    """
+    Averages per ``bucket`` between ``start`` and ``end`` (inclusive dates, either
+    may be None) as parallel lists, oldest first.
+
+    Sums and counts come from one grouped query; when there are more buckets
+    than ``max_points``, runs of adjacent buckets are merged, weighting each by
+    its number of entries. A point's date is the start of its first bucket.
+    """
+    entries = SkinProgress.objects.filter(user=user)
+    if start:
+        entries = entries.filter(date__gte=start)
+    if end:
+        entries = entries.filter(date__lte=end)
+    buckets = list(
+        entries.annotate(period=BUCKETS[bucket]('date'))
+        .values('period')
+        .annotate(
+            entries=Count('id'),
+            followed=Count('id', filter=Q(routine_followed=True)),
+            condition_points=Sum(condition_points()),
+            # Suffixed so the annotations don't clash with the model's own fields
+            **{f'{name}_sum': Sum(field) for name, field in SERIES_FIELDS.items()},
+        )
+        .order_by('period')
+    )
+
+    if len(buckets) > max_points:
+        size = math.ceil(len(buckets) / max_points)
+        buckets = [_merge(buckets[i:i + size]) for i in range(0, len(buckets), size)]
+
+    series = {'dates': [], 'entries': [], 'overall': [], 'compliance': [], **{name: [] for name in SERIES_FIELDS}}
+    for row in buckets:
+        count = row['entries']
+        series['dates'].append(row['period'].isoformat())
+        series['entries'].append(count)
+        series['overall'].append(round(row['condition_points'] / 4 / count, 1))
+        series['compliance'].append(round(row['followed'] / count * 100, 1))
+        for name in SERIES_FIELDS:
+            series[name].append(round(row[f'{name}_sum'] / count, 1))
+    return series
+
+
+def history_version(user):
+    """Changes whenever any of the user's entries is added, edited or deleted"""
+    row = ProgressSummary.objects.filter(user=user).values_list('entry_count', 'updated_at').first()
+    return f'{row[0]}:{row[1].timestamp()}' if row else 'empty'
@@ -0,0 +1,99 @@
+"""Precomputed product recommendations per skin type.
+
+What the result page recommends depends only on the skin type and the
+catalog, so the routine slot picks (cleanser, toner, ...) and the product
+list are worked out for every skin type in a single pass over the catalog
+and cached under ``recommendations:<catalog version>:<skin type>``. Adding
+or deleting a product, or saving a change to one of
+``RECOMMENDATION_FIELDS``, bumps the catalog version (see ``quiz.signals``),
+which retires every entry at once; counter-only saves keep the cache.
+"""
+import time
+
+from django.core.cache import cache
+from django.db import transaction
+
+from products.models import Product
+
+from .models import SkinProfile
+
+
+SKIN_TYPES = ['dry', 'oily', 'combination', 'sensitive', 'normal']
+
+# Routine slot -> Product.category that fills it
+SLOT_CATEGORIES = {
+    'cleanser': Product.CATEGORY_CLEANSER,
+    'toner': Product.CATEGORY_TONER,
+    'serum': Product.CATEGORY_SERUM,
+    'moisturizer': Product.CATEGORY_MOISTURIZER,
+    'sunscreen': Product.CATEGORY_SUNSCREEN,
+    'mask': Product.CATEGORY_MASK,
+}
+CATEGORY_SLOTS = {category: slot for slot, category in SLOT_CATEGORIES.items()}
+
+# Product fields that decide the picks or are shown with them; category follows product_type and name
+RECOMMENDATION_FIELDS = ['name', 'brand', 'product_type', 'category', 'skin_type', 'description', 'image']
+
+CATALOG_VERSION_KEY = 'catalog:version'
+CACHE_TIMEOUT = 60 * 60 * 24
+
+
+def catalog_version():
+    version = cache.get(CATALOG_VERSION_KEY)
+    if version is None:
+        # Millisecond clock, so a version lost to eviction never reuses an old one
+        cache.add(CATALOG_VERSION_KEY, int(time.time() * 1000), None)
+        version = cache.get(CATALOG_VERSION_KEY)
+    return version
+
+
+def bump_catalog_version():
+    """Retire all cached recommendations once the surrounding transaction commits"""
+    def bump():
+        try:
+            cache.incr(CATALOG_VERSION_KEY)
+        except ValueError:
+            cache.set(CATALOG_VERSION_KEY, int(time.time() * 1000), None)
+
+    transaction.on_commit(bump)
+
+
+def _key(version, skin_type):
+    return f'recommendations:{version}:{skin_type}'
+
+
+def build_recommendations():
+    """
+    Slot picks and product lists for every skin type, from one catalog query.
+
+    Each slot takes the lowest-id product of its category (see
+    ``products.categories``).
+    """
+    recommendations = {skin_type: {'slots': dict.fromkeys(SLOT_CATEGORIES), 'products': []} for skin_type in SKIN_TYPES}
+
+    for product in Product.objects.defer('search_vector').order_by('id').iterator():
+        entry = recommendations.get(product.skin_type)
+        if entry is None:
+            continue
+        entry['products'].append(product)
+        slot = CATEGORY_SLOTS.get(product.category)
+        if slot and entry['slots'][slot] is None:
+            entry['slots'][slot] = product
+    return recommendations
+
+
+def get_recommendations(skin_type):
+    """``{'slots': {slot: Product or None}, 'products': [Product, ...]}`` for ``skin_type``"""
+    version = catalog_version()
+    entry = cache.get(_key(version, skin_type))
+    if entry is not None:
+        return entry
+
+    recommendations = build_recommendations()
+    cache.set_many({_key(version, st): value for st, value in recommendations.items()}, CACHE_TIMEOUT)
+    return recommendations.get(skin_type, {'slots': dict.fromkeys(SLOT_CATEGORIES), 'products': []})
+
+
+def profile_skin_type(user):
+    """Skin type from the user's last completed quiz, or None"""
+    return SkinProfile.objects.filter(user=user).values_list('skin_type', flat=True).first()
@@ -0,0 +1,88 @@
+from django.contrib.auth.models import User
+from django.db.models.signals import post_delete, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+
+from products import site_counts
+from products.models import Product
+
+from . import progress
+from .graph import invalidate_quiz_graph
+from .models import Option, Question, SkinProgress, UserAnswer
+from .recommendations import RECOMMENDATION_FIELDS, bump_catalog_version
+
+
+@receiver(pre_save, sender=Product)
+def note_recommendation_changes(sender, instance, raw=False, update_fields=None, **kwargs):
+    """Work out whether this save touches anything the cached recommendations hold"""
+    if update_fields is not None and not set(update_fields) & set(RECOMMENDATION_FIELDS):
+        instance._recommendations_changed = False
+        return
+    previous = None
+    if not raw and instance.pk is not None:
+        previous = Product.objects.filter(pk=instance.pk).values(*RECOMMENDATION_FIELDS).first()
+    if previous is None:
+        instance._recommendations_changed = True
+        return
+    current = {field: getattr(instance, field) for field in RECOMMENDATION_FIELDS}
+    # An empty image is None on the instance but '' in the database
+    current['image'] = current['image'].name or ''
+    previous['image'] = previous['image'] or ''
+    instance._recommendations_changed = current != previous
+
+
+@receiver(post_save, sender=Product)
+def retire_cached_recommendations_on_save(sender, instance, created, **kwargs):
+    if created or getattr(instance, '_recommendations_changed', True):
+        bump_catalog_version()
+
+
+@receiver(post_delete, sender=Product)
+def retire_cached_recommendations_on_delete(sender, **kwargs):
+    """A removed product can move a routine slot pick, so start a new catalog version"""
+    bump_catalog_version()
+
+
+@receiver([post_save, post_delete], sender=Question)
+@receiver([post_save, post_delete], sender=Option)
+def reload_quiz_graph(sender, **kwargs):
+    invalidate_quiz_graph()
+
+
+@receiver(post_save, sender=Question)
+@receiver(post_save, sender=Option)
+def count_created_row(sender, created, raw=False, **kwargs):
+    if created and not raw:
+        site_counts.adjust_for_model(sender, 1)
+
+
+@receiver(post_delete, sender=Question)
+@receiver(post_delete, sender=Option)
+def count_deleted_row(sender, **kwargs):
+    site_counts.adjust_for_model(sender, -1)
+
+
+@receiver(pre_delete, sender=User)
+@receiver(pre_delete, sender=Option)
+def count_cascaded_answers(sender, instance, **kwargs):
+    """
+    Answers are deleted along with their user or option without any signals
+    of their own, so count them while they still exist. A deleted question
+    takes its options with it, which covers its answers too.
+    """
+    field = 'user' if sender is User else 'option'
+    site_counts.adjust('answers', -UserAnswer.objects.filter(**{field: instance}).count())
+
+
+@receiver(post_save, sender=SkinProgress)
+def update_progress_summary_on_save(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    if created:
+        progress.entry_added(instance)
+    else:
+        progress.rebuild_summary(instance.user_id, create=False)
+
+
+@receiver(post_delete, sender=SkinProgress)
+def update_progress_summary_on_delete(sender, instance, **kwargs):
+    progress.rebuild_summary(instance.user_id, create=False)
@@ -1,3 +1,201 @@
+import datetime
+import json
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
 from django.test import TestCase
 
-# Create your tests here.
+from products import site_counts
+
+from products.models import Product
+
+from . import answers, progress, recommendations
+from .models import Option, ProgressSummary, Question, SkinProfile, SkinProgress, UserAnswer
+
+
+class SkinScoreTests(TestCase):
+    def test_highest_count_wins(self):
+        skin_type, scores = answers.score(['oily', 'dry', 'oily'])
+        self.assertEqual(skin_type, 'oily')
+        self.assertEqual(scores, {'dry': 1, 'oily': 2, 'combination': 0, 'sensitive': 0, 'normal': 0})
+
+    def test_ties_do_not_depend_on_answer_order(self):
+        self.assertEqual(answers.score(['sensitive', 'oily'])[0], 'oily')
+        self.assertEqual(answers.score(['oily', 'sensitive'])[0], 'oily')
+
+    def test_no_answers(self):
+        self.assertIsNone(answers.score([])[0])
+
+
+class QuizFlowTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('quizzer', password='pw')
+        self.client.login(username='quizzer', password='pw')
+        self.questions = []
+        for number in range(3):
+            question = Question.objects.create(text=f'Question {number}')
+            for skin_type in ('dry', 'oily'):
+                Option.objects.create(question=question, text=skin_type, skin_type=skin_type)
+            self.questions.append(question)
+
+    def answer(self, question, skin_type):
+        option = question.options.get(skin_type=skin_type)
+        return self.client.post(f'/quiz/question/{question.id}/', {'option': option.id})
+
+    def test_answers_are_saved_once_the_quiz_is_finished(self):
+        self.client.get('/quiz/start/')
+        self.answer(self.questions[0], 'oily')
+        self.answer(self.questions[1], 'dry')
+        self.assertFalse(UserAnswer.objects.exists())
+
+        response = self.answer(self.questions[2], 'oily')
+        self.assertRedirects(response, '/quiz/result/', fetch_redirect_response=False)
+        self.assertEqual(UserAnswer.objects.filter(user=self.user).count(), 3)
+        profile = SkinProfile.objects.get(user=self.user)
+        self.assertEqual(profile.skin_type, 'oily')
+        self.assertEqual(profile.scores['oily'], 2)
+
+        response = self.client.get('/quiz/result/')
+        self.assertEqual(response.context['skin_type'], 'oily')
+
+    def test_answer_count_follows_cascading_deletes(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+        for question in self.questions:
+            self.answer(question, 'dry')
+        self.assertEqual(site_counts.get_counts()['answers'], 3)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.questions[0].options.get(skin_type='dry').delete()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.delete()
+        with self.assertNumQueries(0):
+            self.assertEqual(site_counts.get_counts()['answers'], 0)
+
+    def test_unanswered_question_blocks_finishing(self):
+        self.client.get('/quiz/start/')
+        response = self.answer(self.questions[2], 'dry')
+        self.assertRedirects(response, f'/quiz/question/{self.questions[0].id}/', fetch_redirect_response=False)
+        self.assertFalse(SkinProfile.objects.exists())
+
+
+class RecommendationCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.product = Product.objects.create(
+                name='Milky Cleanser', brand='Acme', product_type='Cleanser', skin_type='dry', description='x',
+            )
+
+    def test_cache_survives_counter_saves_but_not_catalog_changes(self):
+        self.assertEqual(recommendations.get_recommendations('dry')['slots']['cleanser'], self.product)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.product.price = 250
+            self.product.save()
+            self.product.avg_rating = 4.5
+            self.product.save(update_fields=['avg_rating'])
+        with self.assertNumQueries(0):
+            recommendations.get_recommendations('dry')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.product.skin_type = 'oily'
+            self.product.save()
+        self.assertIsNone(recommendations.get_recommendations('dry')['slots']['cleanser'])
+        self.assertEqual(recommendations.get_recommendations('oily')['products'], [self.product])
+
+
+class ProgressSummaryTests(TestCase):
+    def setUp(self):
+        # The navbar cart count is cached per user id
+        cache.clear()
+        self.addCleanup(cache.clear)
+        self.user = User.objects.create_user('tracker', password='pw')
+
+    def add_entry(self, satisfaction, followed=True):
+        return SkinProgress.objects.create(
+            user=self.user, satisfaction_rating=satisfaction, hydration_level=6,
+            clarity=7, breakouts=8, redness=9, routine_followed=followed,
+        )
+
+    def test_summary_follows_new_and_deleted_entries(self):
+        for satisfaction in (4, 5, 8, 9):
+            entry = self.add_entry(satisfaction, followed=satisfaction > 4)
+        stats = progress.summary_stats(ProgressSummary.objects.get(user=self.user))
+        self.assertEqual(stats['total_entries'], 4)
+        self.assertEqual(stats['avg_satisfaction'], 6.5)
+        self.assertEqual(stats['avg_condition'], 7.5)
+        self.assertEqual(stats['routine_compliance'], 75.0)
+        self.assertEqual(stats['trend'], 'improving')
+
+        entry.delete()
+        summary = ProgressSummary.objects.get(user=self.user)
+        self.assertEqual(summary.entry_count, 3)
+        self.assertEqual(summary.recent_satisfaction, [8, 5, 4])
+
+    def test_backdated_entry_matches_a_rebuild(self):
+        for day, satisfaction in ((10, 4), (12, 8)):
+            SkinProgress.objects.create(
+                user=self.user, date=datetime.date(2024, 1, day), satisfaction_rating=satisfaction,
+                hydration_level=6, clarity=7, breakouts=8, redness=9,
+            )
+        SkinProgress.objects.create(
+            user=self.user, date=datetime.date(2024, 1, 11), satisfaction_rating=2,
+            hydration_level=6, clarity=7, breakouts=8, redness=9,
+        )
+        summary = ProgressSummary.objects.get(user=self.user)
+        self.assertEqual(summary.recent_satisfaction, [8, 2, 4])
+        self.assertEqual(summary.last_entry_date, datetime.date(2024, 1, 12))
+
+        progress.rebuild_summary(self.user.id)
+        self.assertEqual(ProgressSummary.objects.get(user=self.user).recent_satisfaction, [8, 2, 4])
+
+    def test_progress_page_reads_summary_and_history(self):
+        self.add_entry(7)
+        self.client.login(username='tracker', password='pw')
+        # Session, user, the navbar cart count, the summary and the recent entries
+        with self.assertNumQueries(5):
+            response = self.client.get('/quiz/progress/')
+        self.assertTrue(response.context['today_entry'])
+        self.assertEqual(response.context['progress_entries'][0]['overall_condition'], 7.5)
+
+    def test_history_api_buckets_and_etag(self):
+        for satisfaction in (4, 8):
+            self.add_entry(satisfaction)
+        self.client.login(username='tracker', password='pw')
+        response = self.client.get('/quiz/api/progress/?bucket=month')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['entries'], [2])
+        self.assertEqual(response.json()['satisfaction'], [6.0])
+
+        etag = response['ETag']
+        response = self.client.get('/quiz/api/progress/?bucket=month', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.add_entry(9)
+        response = self.client.get('/quiz/api/progress/?bucket=month', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+
+class ProgressTransferTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('mover', password='pw')
+        self.client.login(username='mover', password='pw')
+
+    def test_csv_import_then_export(self):
+        data = (
+            'date,satisfaction_rating,hydration_level,clarity,breakouts,redness,routine_followed,notes\n'
+            '2024-01-02,7,6,5,4,3,true,First\n'
+            '2024-01-02,8,8,8,8,8,true,Same day again\n'
+            '2024-01-03,11,6,5,4,3,no,\n'
+        )
+        upload = SimpleUploadedFile('history.csv', data.encode())
+        self.client.post('/quiz/progress/import/', {'file': upload})
+        entry = SkinProgress.objects.get(user=self.user)
+        self.assertEqual((entry.date.isoformat(), entry.satisfaction_rating, entry.notes), ('2024-01-02', 7, 'First'))
+        self.assertEqual(ProgressSummary.objects.get(user=self.user).entry_count, 1)
+
+        response = self.client.get('/quiz/progress/export/?format=json')
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual(len(lines), 1)
+        self.assertEqual(json.loads(lines[0])['date'], '2024-01-02')
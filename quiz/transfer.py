@@ -0,0 +1,172 @@
+"""Bulk import and export of skin progress history.
+
+Exports stream straight from a chunked queryset, so a user's whole history
+is never held in memory. Imports read the file row by row, validate each
+row and insert the valid ones with ``bulk_create`` in batches. Both formats
+work a row at a time: CSV with a header row, and JSON Lines (one JSON
+object per line) rather than a single JSON array, which would have to be
+parsed whole.
+"""
+import csv
+import datetime
+import io
+import json
+
+from django.db import transaction
+
+from . import progress
+from .models import SkinProgress
+
+
+FIELDS = [
+    'date', 'satisfaction_rating', 'hydration_level', 'clarity',
+    'breakouts', 'redness', 'routine_followed', 'notes',
+]
+SCORE_FIELDS = ['satisfaction_rating', 'hydration_level', 'clarity', 'breakouts', 'redness']
+
+FORMATS = {
+    'csv': ('text/csv', 'csv'),
+    'json': ('application/x-ndjson', 'jsonl'),
+}
+
+BATCH_SIZE = 1000
+MAX_REPORTED_ERRORS = 20
+
+_TRUE = {'1', 'true', 'yes', 'y', 'on'}
+_FALSE = {'0', 'false', 'no', 'n', 'off', ''}
+
+
+class _Echo:
+    """File-like object whose write() hands the line back, for streaming csv.writer output"""
+    def write(self, value):
+        return value
+
+
+def _entry_rows(user):
+    return (
+        SkinProgress.objects.filter(user=user)
+        .order_by('date', 'id')
+        .values_list(*FIELDS)
+        .iterator(chunk_size=BATCH_SIZE)
+    )
+
+
+def export_csv(user):
+    """The user's entries as CSV, yielded a line at a time"""
+    writer = csv.writer(_Echo())
+    yield writer.writerow(FIELDS)
+    for row in _entry_rows(user):
+        row = list(row)
+        row[0] = row[0].isoformat()
+        row[-1] = row[-1] or ''
+        yield writer.writerow(row)
+
+
+def export_json(user):
+    """The user's entries as JSON Lines, yielded a line at a time"""
+    for row in _entry_rows(user):
+        entry = dict(zip(FIELDS, row))
+        entry['date'] = entry['date'].isoformat()
+        yield json.dumps(entry) + '\n'
+
+
+EXPORTERS = {'csv': export_csv, 'json': export_json}
+
+
+def _read_csv(text):
+    return csv.DictReader(text)
+
+
+def _read_json(text):
+    for line in text:
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            yield json.loads(line)
+        except ValueError:
+            # Reported as an invalid row by _build_entry
+            yield None
+
+
+READERS = {'csv': _read_csv, 'json': _read_json}
+
+
+def _build_entry(user, row):
+    """A SkinProgress for ``row``, or raise ValueError describing what's wrong with it"""
+    if not isinstance(row, dict):
+        raise ValueError('not a JSON object')
+    try:
+        date = datetime.date.fromisoformat(str(row.get('date') or '').strip())
+    except ValueError:
+        raise ValueError('date must be YYYY-MM-DD')
+
+    scores = {}
+    for field in SCORE_FIELDS:
+        try:
+            value = int(str(row.get(field, '')).strip())
+        except ValueError:
+            value = None
+        if value is None or not 1 <= value <= 10:
+            raise ValueError(f'{field} must be a whole number from 1 to 10')
+        scores[field] = value
+
+    followed = row.get('routine_followed', True)
+    if not isinstance(followed, bool):
+        followed = str(followed).strip().lower()
+        if followed not in _TRUE | _FALSE:
+            raise ValueError('routine_followed must be true or false')
+        followed = followed in _TRUE
+
+    notes = row.get('notes') or None
+    return SkinProgress(user=user, date=date, routine_followed=followed, notes=notes and str(notes), **scores)
+
+
+def import_entries(user, binary_file, fmt):
+    """
+    Add the entries in ``binary_file`` to the user's history.
+
+    Rows for a date the user already has (or that appears earlier in the
+    file) are skipped, so re-importing a file adds nothing. Invalid rows are
+    skipped and reported. Returns ``{'created', 'skipped', 'errors'}``, with
+    at most ``MAX_REPORTED_ERRORS`` messages in ``errors``.
+    """
+    text = io.TextIOWrapper(binary_file, encoding='utf-8-sig', newline='')
+    seen_dates = set(SkinProgress.objects.filter(user=user).values_list('date', flat=True))
+    result = {'created': 0, 'skipped': 0, 'errors': []}
+    batch = []
+
+    def flush():
+        with transaction.atomic():
+            SkinProgress.objects.bulk_create(batch)
+        result['created'] += len(batch)
+        batch.clear()
+
+    try:
+        # Line 1 is the CSV header
+        first_line = 2 if fmt == 'csv' else 1
+        for line_number, row in enumerate(READERS[fmt](text), first_line):
+            try:
+                entry = _build_entry(user, row)
+            except ValueError as e:
+                result['skipped'] += 1
+                if len(result['errors']) < MAX_REPORTED_ERRORS:
+                    result['errors'].append(f'Line {line_number}: {e}.')
+                continue
+            if entry.date in seen_dates:
+                result['skipped'] += 1
+                continue
+            seen_dates.add(entry.date)
+            batch.append(entry)
+            if len(batch) >= BATCH_SIZE:
+                flush()
+        if batch:
+            flush()
+    except (UnicodeDecodeError, csv.Error) as e:
+        result['errors'].append(f'The file could not be read: {e}')
+    finally:
+        # bulk_create skips the SkinProgress signals
+        if result['created']:
+            progress.rebuild_summary(user.id)
+        text.detach()
+    return result
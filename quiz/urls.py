@@ -6,5 +6,8 @@ urlpatterns = [
     path('question/<int:qid>/', views.quiz_question, name='quiz_question'),
     path('result/', views.quiz_result, name='quiz_result'),
     path('progress/', views.track_progress, name='track_progress'),
+    path('progress/export/', views.export_progress, name='export_progress'),
+    path('progress/import/', views.import_progress, name='import_progress'),
+    path('api/progress/', views.api_progress_history, name='api_progress_history'),
     
 ]
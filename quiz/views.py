@@ -1,56 +1,61 @@
-from django.shortcuts import render, redirect
-from .models import Question, Option, UserAnswer, SkinProgress
-from products.models import Product
-from collections import Counter
+from django.shortcuts import get_object_or_404, render, redirect
+from .models import SkinProgress
+from . import answers, progress, transfer
+from .graph import get_quiz_graph
+from .recommendations import get_recommendations, profile_skin_type
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
-import json
-from datetime import timedelta
+import hashlib
 from django.utils import timezone
-from django.http import JsonResponse
+from django.utils.dateparse import parse_date
+from django.http import JsonResponse, StreamingHttpResponse
+from django.contrib.auth.models import User
+from django.views.decorators.cache import cache_control
+from django.views.decorators.http import etag, require_GET, require_POST
 
 @login_required(login_url='/accounts/login/')
 def start_quiz(request):
-    # Clear previous answers for this user
-    UserAnswer.objects.filter(user=request.user).delete()
-    
+    # Answers collect in the session; stored ones are replaced when the quiz is finished
+    answers.start(request.session)
+
     # Get first question
-    first_question = Question.objects.order_by('id').first()
-    if first_question:
-        return redirect('quiz_question', qid=first_question.id)
+    first_id = get_quiz_graph().first_id
+    if first_id:
+        return redirect('quiz_question', qid=first_id)
     else:
         messages.error(request, "No questions found in the quiz.")
         return redirect('dashboard')
 
 @login_required(login_url='/accounts/login/')
 def quiz_question(request, qid):
-    try:
-        question = Question.objects.get(id=qid)
-    except Question.DoesNotExist:
+    # Questions, ordering and options all come from the in-memory quiz graph
+    graph = get_quiz_graph()
+    question = graph.question(qid)
+    if question is None:
         return redirect('quiz_result')
 
     # Calculate progress
-    all_questions = Question.objects.order_by('id')
-    total_questions = all_questions.count()
-    current_number = list(all_questions.values_list('id', flat=True)).index(question.id) + 1
+    total_questions = graph.total
+    current_number = graph.position[qid]
     progress_percentage = int((current_number / total_questions) * 100) if total_questions > 0 else 0
 
     if request.method == 'POST':
-        option_id = request.POST.get('option')
-        if option_id:
-            # Save answer (update if already exists)
-            UserAnswer.objects.update_or_create(
-                user=request.user,
-                question=question,
-                defaults={'option_id': option_id}
-            )
+        option_id = request.POST.get('option', '')
+        if option_id.isdigit() and graph.option_skin_type(qid, int(option_id)):
+            answers.record_answer(request.session, qid, int(option_id))
 
             # Redirect to next question or result
-            next_question = Question.objects.filter(id__gt=question.id).order_by('id').first()
-            if next_question:
-                return redirect('quiz_question', qid=next_question.id)
-            else:
-                return redirect('quiz_result')
+            next_id = graph.next[qid]
+            if next_id:
+                return redirect('quiz_question', qid=next_id)
+
+            # Last question: every answer must be in before they are saved
+            missing_id = answers.first_unanswered(request.session, graph)
+            if missing_id:
+                messages.warning(request, "Please answer every question to see your result.")
+                return redirect('quiz_question', qid=missing_id)
+            answers.commit_answers(request.user, request.session, graph)
+            return redirect('quiz_result')
         else:
             messages.warning(request, "Please select an option before proceeding.")
 
@@ -63,43 +68,28 @@ def quiz_question(request, qid):
 
 @login_required(login_url='/accounts/login/')
 def quiz_result(request):
-    # Get user answers
-    answers = UserAnswer.objects.filter(user=request.user)
-
-    if not answers.exists():
+    # Skin type stored when the quiz was finished (see quiz.answers)
+    skin_type = profile_skin_type(request.user)
+    if not skin_type:
         messages.warning(request, "No answers found. Please start the quiz first.")
         return redirect('quiz_start')
 
-    # Calculate most common skin type
-    skin_types = [a.option.skin_type for a in answers]
-    skin_type = Counter(skin_types).most_common(1)[0][0]
-
-    # Get products for the skin type
-    products = Product.objects.filter(skin_type=skin_type)
+    # Products and routine slot picks are precomputed per skin type (see quiz.recommendations)
+    recommendations = get_recommendations(skin_type)
 
     # Generate skincare routines based on skin type
-    routines = generate_routine(skin_type, products)
+    routines = generate_routine(skin_type, recommendations['slots'])
 
     return render(request, 'quiz/result.html', {
         'skin_type': skin_type,
-        'products': products,
+        'products': recommendations['products'],
         'morning_routine': routines['morning'],
         'night_routine': routines['night'],
     })
 
-def generate_routine(skin_type, products):
-    """Generate personalized morning and night skincare routines"""
+def generate_routine(skin_type, product_types):
+    """Generate personalized morning and night skincare routines from the per-slot product picks"""
     
-    # Organize products by type
-    product_types = {
-        'cleanser': products.filter(product_type__icontains='Cleanser').first(),
-        'toner': products.filter(product_type__icontains='Toner').first(),
-        'serum': products.filter(product_type__icontains='Serum').first(),
-        'moisturizer': products.filter(product_type__icontains='Moisturizer').first() or products.filter(product_type__icontains='Cream').first(),
-        'sunscreen': products.filter(product_type__icontains='Sunscreen').first() or products.filter(product_type__icontains='SPF').first(),
-        'mask': products.filter(product_type__icontains='Mask').first(),
-    }
-
     # Skin type specific recommendations
     skin_tips = {
         'dry': {
@@ -251,7 +241,7 @@ def track_progress(request):
     if request.method == 'POST':
         # Save new progress entry
         try:
-            progress = SkinProgress.objects.create(
+            SkinProgress.objects.create(
                 user=request.user,
                 satisfaction_rating=int(request.POST.get('satisfaction_rating')),
                 hydration_level=int(request.POST.get('hydration_level')),
@@ -266,51 +256,16 @@ def track_progress(request):
         except Exception as e:
             messages.error(request, f'Error saving progress: {str(e)}')
     
-    # Get user's progress entries
-    progress_entries = SkinProgress.objects.filter(user=request.user).order_by('-date')[:30]
-    
-    # Prepare chart data
-    chart_data = {
-        'dates': [],
-        'satisfaction': [],
-        'hydration': [],
-        'clarity': [],
-        'breakouts': [],
-        'redness': [],
-        'overall': []
-    }
-    
-    for entry in reversed(progress_entries):
-        chart_data['dates'].append(entry.date.strftime('%b %d'))
-        chart_data['satisfaction'].append(entry.satisfaction_rating)
-        chart_data['hydration'].append(entry.hydration_level)
-        chart_data['clarity'].append(entry.clarity)
-        chart_data['breakouts'].append(entry.breakouts)
-        chart_data['redness'].append(entry.redness)
-        chart_data['overall'].append(entry.overall_condition)
-    
-    # Calculate statistics
-    stats = {}
-    if progress_entries.exists():
-        stats['avg_satisfaction'] = round(sum([e.satisfaction_rating for e in progress_entries]) / len(progress_entries), 1)
-        stats['avg_condition'] = round(sum([e.overall_condition for e in progress_entries]) / len(progress_entries), 1)
-        stats['total_entries'] = len(progress_entries)
-        stats['routine_compliance'] = round(sum([1 for e in progress_entries if e.routine_followed]) / len(progress_entries) * 100, 1)
-        
-        # Calculate trend (comparing first half vs second half)
-        mid_point = len(progress_entries) // 2
-        if mid_point > 0:
-            recent_avg = round(sum([e.satisfaction_rating for e in list(progress_entries)[:mid_point]]) / mid_point, 1)
-            older_avg = round(sum([e.satisfaction_rating for e in list(progress_entries)[mid_point:]]) / len(list(progress_entries)[mid_point:]), 1)
-            stats['trend'] = 'improving' if recent_avg > older_avg else 'stable' if recent_avg == older_avg else 'declining'
-            stats['trend_diff'] = round(abs(recent_avg - older_avg), 1)
-    
+    # Statistics come from the running summary; the chart series load from api_progress_history
+    summary = progress.get_summary(request.user)
+    progress_entries = progress.recent_entries(request.user, limit=10)
+    stats = progress.summary_stats(summary)
+
     # Check if user logged today
-    today_entry = SkinProgress.objects.filter(user=request.user, date=timezone.now().date()).exists()
-    
+    today_entry = summary.last_entry_date == timezone.now().date()
+
     context = {
         'progress_entries': progress_entries,
-        'chart_data_json': json.dumps(chart_data),
         'stats': stats,
         'today_entry': today_entry,
     }
@@ -318,4 +273,76 @@ def track_progress(request):
     return render(request, 'quiz/track_progress.html', context)
 
 
+def _date_param(request, name):
+    value = request.GET.get(name)
+    if not value:
+        return None
+    date = parse_date(value)
+    if date is None:
+        raise ValueError(value)
+    return date
+
+
+def _progress_history_etag(request):
+    version = progress.history_version(request.user)
+    key = f'{request.user.id}:{version}:{request.GET.urlencode()}'
+    return hashlib.md5(key.encode()).hexdigest()
+
+
+@login_required(login_url='/accounts/login/')
+@require_GET
+@cache_control(private=True, max_age=0)
+@etag(_progress_history_etag)
+def api_progress_history(request):
+    """Progress chart series: ?start=YYYY-MM-DD&end=YYYY-MM-DD&bucket=day|week|month&points=N"""
+    bucket = request.GET.get('bucket', 'day')
+    if bucket not in progress.BUCKETS:
+        return JsonResponse({'error': 'bucket must be day, week or month.'}, status=400)
+    try:
+        start = _date_param(request, 'start')
+        end = _date_param(request, 'end')
+        points = int(request.GET.get('points', progress.MAX_POINTS))
+    except ValueError:
+        return JsonResponse({'error': 'Invalid start, end or points.'}, status=400)
+    points = max(1, min(points, progress.MAX_POINTS))
+
+    series = progress.history_series(request.user, start=start, end=end, bucket=bucket, max_points=points)
+    return JsonResponse({'bucket': bucket, **series})
+
+
+@login_required(login_url='/accounts/login/')
+@require_GET
+def export_progress(request):
+    """Download progress history: ?format=csv|json; staff may add &user=<username>"""
+    fmt = request.GET.get('format', 'csv')
+    if fmt not in transfer.FORMATS:
+        return JsonResponse({'error': 'format must be csv or json.'}, status=400)
+    user = request.user
+    username = request.GET.get('user')
+    if username and request.user.is_staff:
+        user = get_object_or_404(User, username=username)
+
+    content_type, extension = transfer.FORMATS[fmt]
+    response = StreamingHttpResponse(transfer.EXPORTERS[fmt](user), content_type=content_type)
+    response['Content-Disposition'] = f'attachment; filename="skin-progress-{user.username}.{extension}"'
+    return response
+
+
+@login_required(login_url='/accounts/login/')
+@require_POST
+def import_progress(request):
+    """Upload a CSV or JSON Lines file of past entries"""
+    upload = request.FILES.get('file')
+    if not upload:
+        messages.error(request, 'Please choose a file to import.')
+        return redirect('track_progress')
+    fmt = 'json' if upload.name.lower().endswith(('.json', '.jsonl', '.ndjson')) else 'csv'
 
+    result = transfer.import_entries(request.user, upload.open('rb'), fmt)
+    if result['created']:
+        messages.success(request, f"✅ Imported {result['created']} progress entries!")
+    if result['skipped']:
+        messages.warning(request, f"Skipped {result['skipped']} rows that were invalid or for dates you already logged.")
+    for error in result['errors']:
+        messages.error(request, error)
+    return redirect('track_progress')
@@ -37,6 +37,7 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
     'quiz',
     'products',
     'accounts',
@@ -48,6 +49,7 @@ MIDDLEWARE = [
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'products.middleware.GuestCartMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -65,6 +67,7 @@ TEMPLATES = [
                 'django.template.context_processors.request',
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
+                'products.context_processors.cart_summary',
             ],
         },
     },
@@ -147,3 +150,41 @@ LOGIN_URL = '/accounts/login/'
 # IMPORTANT: Replace these placeholder values with your actual Razorpay keys
 RAZORPAY_KEY_ID = 'rzp_test_your_key_id_here'  # Example: 'rzp_test_1234567890abcd'
 RAZORPAY_KEY_SECRET = 'your_key_secret_here'  # Example: 'abcdef1234567890'
+
+# Razorpay HTTP client: connect/read timeouts (seconds) and connection pool size
+RAZORPAY_CONNECT_TIMEOUT = 3.05
+RAZORPAY_READ_TIMEOUT = 10
+RAZORPAY_POOL_SIZE = 10
+# Set to 'products.payments.FakeGateway' to run checkout against an in-memory gateway
+RAZORPAY_GATEWAY_CLASS = None
+
+# Webhook secret set on the Razorpay dashboard (Settings -> Webhooks); webhooks are rejected while empty
+RAZORPAY_WEBHOOK_SECRET = ''
+# Payment events are retried with exponential backoff up to this many attempts
+PAYMENT_EVENT_MAX_ATTEMPTS = 8
+
+# Cache: local memory per process by default. Set REDIS_URL (e.g. redis://127.0.0.1:6379/1)
+# to share the cart badge and community hub caches between processes.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'skinsense',
+    }
+}
+if os.environ.get('REDIS_URL'):
+    CACHES['default'] = {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': os.environ['REDIS_URL'],
+    }
+
+# Routine view counter: seconds between batched writes (0 = only flush at exit),
+# and how long a repeat view by the same user/session is ignored (0 = count every view)
+ROUTINE_VIEW_FLUSH_INTERVAL = 10
+ROUTINE_VIEW_DEDUP_SECONDS = 30 * 60
+
+# Dashboard row counts are cached and shifted on save/delete; this bounds how long a
+# drifted count can live between `reconcile_counters` runs. Tables listed in
+# SITE_COUNTS_ESTIMATED use Postgres' planner estimate once past the threshold.
+SITE_COUNTS_TIMEOUT = 60 * 60
+SITE_COUNTS_ESTIMATED = ['answers']
+SITE_COUNTS_ESTIMATE_THRESHOLD = 100000